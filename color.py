@@ -29,6 +29,10 @@ Note:
    or put ``bg256`` into ``fg256``. ``xxx_hl`` and ``hl256`` are mostly used
    independently.
 
+4. 8-bit colors and styles are ``Style`` objects, they could also be composed
+   beforehand with ``+``, like ``bold + yellow + red_bg``, which renders with
+   a single escape sequence on each side of the string.
+
 API
 ---
 
@@ -81,31 +85,255 @@ Styles:
    ``bg256`` will set color as background.
    ``hg256`` will highlight input with the color.
 
-   :param str hexrgb: The hex rgb color string, accept length 3 and 6. eg: ``555``, ``912D2B``
+   :param str hexrgb: The hex rgb color string (or bytes), accept length 3, 6 and 8
+       (alpha is ignored), optionally prefixed by ``#``. eg: ``555``, ``#912D2B``
    :param str s: The input string
    :return: The decorated string
    :rtype: string
-   :raises ValueError: If the input string's length not equal to 3 or 6.
+   :raises ValueError: If the input string's length not equal to 3, 6 or 8, or it has non hex digits.
+
+
+Truecolor:
+- fgtrue
+- bgtrue
+- hltrue
+
+.. py:function:: <truecolor_function>(hexrgb, s)
+
+   Same as the 256 color functions, but renders 24 bit color on terminals
+   that support it (``COLORTERM=truecolor``), and falls back to 256 colors
+   or 16 colors according to ``color_support().level``.
 """
 
-from typing import Union, Any, Callable, Optional, Tuple, List, Dict
+from __future__ import annotations
+
+from collections import OrderedDict
+from contextvars import ContextVar
+import io
+import os
 import sys
+import _thread
+
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Union, Any, AnyStr, Callable, Optional, Tuple, List, Dict, Mapping
 
 
+###############################################################################
+# Lazy attributes
+###############################################################################
+#
+# Color functions, styles and lookup tables are built on first access through
+# the module ``__getattr__``, so that importing this module stays cheap.
+
+# name -> builder, which returns a dict of the names it builds
+_LAZY: Dict[str, Callable[[], Dict[str, Any]]] = {}
+# name -> value of the names built so far
+_built: Dict[str, Any] = {}
+# builders call each other, and each name is built once even if threads race for it
+_lazy_lock = _thread.RLock()
+
+
+def _lazy(*names: str) -> Callable:
+    """Registers a builder of the module attributes ``names``"""
+    def decorator(builder):
+        for name in names:
+            _LAZY[name] = builder
+        return builder
+    return decorator
+
+
+def __getattr__(name: str) -> Any:
+    # also called directly by the module itself, which finds built names here
+    if name in _built:
+        return _built[name]
+    builder = _LAZY.get(name)
+    if builder is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    with _lazy_lock:
+        if name in _built:
+            return _built[name]
+        values = builder()
+        globals().update(values)
+        _built.update(values)
+    return values[name]
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_LAZY))
+
+
+###############################################################################
+# Color capability
+###############################################################################
+
+# Color levels a stream could display, ordered from poor to rich.
+COLOR_NONE = 0
+COLOR_16 = 1
+COLOR_256 = 2
+COLOR_TRUE = 3
+
 _use_color_no_tty = True
 
 
+class ColorSupport:
+    """The resolved color capability of a stream.
+
+    Resolving involves an ``isatty()`` syscall and reading the environment,
+    so it is done once and cached until the stream changes or
+    ``reset_color_support()`` is called.
+    """
+    __slots__ = ('stream', 'enabled', 'level')
+
+    def __init__(self, stream: Any, level: int):
+        self.stream = stream
+        self.level = level
+        self.enabled = level > COLOR_NONE
+
+    def __repr__(self) -> str:
+        return 'ColorSupport(enabled={}, level={})'.format(self.enabled, self.level)
+
+
+def _isatty(stream: Any) -> bool:
+    isatty = getattr(stream, 'isatty', None)
+    if isatty is None:
+        return False
+    try:
+        return bool(isatty())
+    except ValueError:
+        # closed stream
+        return False
+
+
+def detect_color_level(stream: Any = None, environ: Optional[Mapping[str, str]] = None) -> int:
+    """Detects the color level of a stream from its tty state and the environment
+
+    ``NO_COLOR`` disables color, ``FORCE_COLOR`` enables it (``0`` or ``false`` disables,
+    ``1``, ``2``, ``3`` sets the minimum level), ``TERM=dumb`` disables it, otherwise color is used on a tty, or on a non-tty
+    if ``use_color_no_tty(True)`` (the default) is set.
+    ``COLORTERM`` and ``TERM`` decide how many colors could be used.
+
+    :rtype: int, one of ``COLOR_NONE``, ``COLOR_16``, ``COLOR_256``, ``COLOR_TRUE``
+    """
+    if stream is None:
+        stream = sys.stdout
+    if environ is None:
+        environ = os.environ
+
+    if environ.get('NO_COLOR'):
+        return COLOR_NONE
+    term = environ.get('TERM', '')
+    force = environ.get('FORCE_COLOR')
+    min_level = COLOR_NONE
+    if force is not None and force != '':
+        if force.lower() in ('0', 'false'):
+            return COLOR_NONE
+        if force in ('1', '2', '3'):
+            min_level = int(force)
+    elif term == 'dumb':
+        return COLOR_NONE
+    elif not _isatty(stream) and not _use_color_no_tty:
+        return COLOR_NONE
+
+    if environ.get('COLORTERM', '').lower() in ('truecolor', '24bit'):
+        level = COLOR_TRUE
+    elif term == 'linux' or term.startswith(('vt', 'ansi', 'cons')):
+        level = COLOR_16
+    else:
+        level = COLOR_256
+    return max(level, min_level)
+
+
+_support: Optional[ColorSupport] = None
+
+# The color capability set by ``color_context()`` for the current thread or asyncio task
+_context_support: ContextVar[Optional[ColorSupport]] = ContextVar('color_support', default=None)
+# The capabilities to restore when the ``color_context()`` blocks entered in this context exit
+_context_restore: ContextVar[Tuple[Optional[ColorSupport], ...]] = ContextVar('color_support_restore', default=())
+
+
+def color_support() -> ColorSupport:
+    """Returns the cached color capability of ``sys.stdout``, or the one set by
+    ``color_context()`` in the current context.
+
+    It is resolved again automatically when ``sys.stdout`` is swapped.
+    """
+    support = _context_support.get()
+    if support is None:
+        support = _support
+        if support is None or support.stream is not sys.stdout:
+            support = _resolve_color_support()
+    return support
+
+
+def _resolve_color_support() -> ColorSupport:
+    global _support
+    stream = sys.stdout
+    _support = support = ColorSupport(stream, detect_color_level(stream))
+    return support
+
+
+def reset_color_support():
+    """Drops the cached color capability, it will be resolved on next use.
+
+    Call this after changing ``NO_COLOR``, ``FORCE_COLOR``, ``TERM`` or ``COLORTERM``.
+    """
+    global _support
+    _support = None
+
+
 def use_color_no_tty(flag):
     global _use_color_no_tty
     _use_color_no_tty = flag
+    reset_color_support()
+
+
+def use_color() -> bool:
+    support = _context_support.get()
+    if support is None:
+        support = _support
+        if support is None or support.stream is not sys.stdout:
+            support = _resolve_color_support()
+    return support.enabled
+
+
+class ColorContext:
+    """See ``color_context()``, it could be entered again, nested or from other threads"""
+    __slots__ = ('support',)
+
+    def __init__(self, support: ColorSupport):
+        self.support = support
+
+    def __enter__(self) -> ColorSupport:
+        # kept in a context variable rather than on self, each thread and task has its own
+        _context_restore.set(_context_restore.get() + (_context_support.get(),))
+        _context_support.set(self.support)
+        return self.support
+
+    def __exit__(self, *exc):
+        restore = _context_restore.get()
+        _context_restore.set(restore[:-1])
+        _context_support.set(restore[-1])
 
 
-def use_color():
-    if sys.stdout.isatty():
-        return True
-    if _use_color_no_tty:
-        return True
-    return False
+def color_context(enabled: bool = True, level: Optional[int] = None) -> ColorContext:
+    """Enables or disables color in a ``with`` block, for the current thread or
+    asyncio task only, other threads and tasks keep their own setting.
+
+    >>> with color_context(False):
+    ...     log.info(red('plain in this task'))
+
+    :param level: the color level to render, defaults to the detected level
+        of ``sys.stdout``, or ``COLOR_256`` if it has no color
+    """
+    if not enabled:
+        level = COLOR_NONE
+    elif level is None:
+        support = _support
+        if support is None or support.stream is not sys.stdout:
+            support = _resolve_color_support()
+        level = support.level or COLOR_256
+    return ColorContext(ColorSupport(None, level))
 
 
 def esc(*codes: Union[int, str]) -> str:
@@ -115,63 +343,637 @@ def esc(*codes: Union[int, str]) -> str:
     return '\x1b[{}m'.format(';'.join(str(c) for c in codes))
 
 
+def t_(b: Union[bytes, str]) -> str:
+    """ensure text type"""
+    if isinstance(b, bytes):
+        return b.decode()
+    return b
+
+
+###############################################################################
+# Cache
+###############################################################################
+
+@_lazy('CacheInfo')
+def _build_cache_info() -> Dict[str, Any]:
+    from collections import namedtuple
+    return {'CacheInfo': namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])}
+
+
+def memorize(func: Optional[Callable] = None, *, maxsize: Optional[int] = None) -> Callable:
+    """Caches the results of ``func`` by positional arguments.
+
+    Could be used as ``@memorize`` (unbounded) or ``@memorize(maxsize=n)``,
+    which evicts the least recently used result once there are ``n`` of them.
+    The wrapper has ``cache_info()`` and ``cache_clear()`` like ``functools.lru_cache``.
+
+    It is safe to call from many threads without a global lock. Threads that miss
+    the same arguments while they are computed wait for the first one instead
+    of computing them again, a lock is only created for such a wait. The counts
+    of ``cache_info()`` may be slightly off under concurrent calls.
+    """
+    if func is None:
+        return lambda f: memorize(f, maxsize=maxsize)
+
+    cache: Dict[tuple, Any] = OrderedDict() if maxsize is not None else {}
+    func._cache = cache  # type: ignore
+    hits = misses = evictions = 0
+    # arguments being computed -> the id of the thread computing them
+    filling: Dict[tuple, int] = {}
+    # arguments being computed -> a lock held until they are computed, only
+    # created when another thread waits for them
+    waiting: Dict[tuple, Any] = {}
+    get_ident = _thread.get_ident
+
+    def wrapper(*args, **kwargs):
+        nonlocal hits, misses, evictions
+        if kwargs:
+            return func(*args, **kwargs)
+        try:
+            result = cache[args]
+        except KeyError:
+            pass
+        else:
+            hits += 1
+            if maxsize is not None:
+                try:
+                    cache.move_to_end(args)  # type: ignore
+                except KeyError:
+                    # evicted by another thread meanwhile
+                    pass
+            return result
+
+        misses += 1
+        # claim the arguments with an atomic setdefault
+        me = get_ident()
+        if filling.setdefault(args, me) != me:
+            # computing in another thread, wait for it with a lock it releases when done
+            lock = _thread.allocate_lock()
+            lock.acquire()
+            lock = waiting.setdefault(args, lock)
+            if args in filling:
+                with lock:
+                    pass
+            try:
+                return cache[args]
+            except KeyError:
+                # it raised, or the result is already evicted
+                return func(*args)
+
+        try:
+            result = func(*args)
+            if maxsize is None:
+                cache[args] = result
+            elif maxsize > 0:
+                cache[args] = result
+                if len(cache) > maxsize:
+                    try:
+                        cache.popitem(last=False)  # type: ignore
+                        evictions += 1
+                    except KeyError:
+                        # emptied by another thread meanwhile
+                        pass
+        finally:
+            filling.pop(args, None)
+            if waiting:
+                lock = waiting.pop(args, None)
+                if lock is not None:
+                    lock.release()
+        return result
+
+    def cache_info() -> tuple:
+        return __getattr__('CacheInfo')(hits, misses, evictions, maxsize, len(cache))
+
+    def cache_clear():
+        nonlocal hits, misses, evictions
+        cache.clear()
+        hits = misses = evictions = 0
+
+    for i in ('__module__', '__name__', '__doc__'):
+        setattr(wrapper, i, getattr(func, i))
+    wrapper.__dict__.update(getattr(func, '__dict__', {}))  # type: ignore
+    wrapper._origin = func  # type: ignore
+    wrapper.cache_info = cache_info  # type: ignore
+    wrapper.cache_clear = cache_clear  # type: ignore
+    return wrapper
+
+
+# Enough for the colors of a few large gradients, while keeping long running
+# processes from growing up to 16.7M entries.
+CACHE_MAXSIZE = 4096
+
+
 ###############################################################################
 # 8 bit Color
 ###############################################################################
 
-def make_color(start, end: str) -> Callable[[str], str]:
-    def color_func(s: str) -> str:
+def make_color(start, end: str) -> Callable[[AnyStr], AnyStr]:
+    bstart, bend = start.encode(), end.encode()
+
+    def color_func(s):
         if not use_color():
             return s
 
         # render
+        if isinstance(s, bytes):
+            return bstart + s + bend
         return start + s + end
 
     return color_func
 
 
+def _sgr_params(codes: Tuple[int, ...]) -> List[Tuple[int, ...]]:
+    """Groups SGR codes into parameters, ``38;5;n`` and ``38;2;r;g;b`` are kept together"""
+    params = []
+    i = 0
+    n = len(codes)
+    while i < n:
+        c = codes[i]
+        if (c == 38 or c == 48) and i + 1 < n:
+            size = 3 if codes[i + 1] == 5 else 5 if codes[i + 1] == 2 else 1
+            params.append(codes[i:i + size])
+            i += size
+        else:
+            params.append((c,))
+            i += 1
+    return params
+
+
+def _sgr_slot(code: int) -> Union[int, str]:
+    """The attribute a SGR code sets, codes of the same slot override each other"""
+    if 30 <= code <= 38 or 90 <= code <= 97:
+        return 'fg'
+    if 40 <= code <= 48 or 100 <= code <= 107:
+        return 'bg'
+    return code
+
+
+# The SGR code that resets each slot
+_SLOT_RESETS: Dict[Union[int, str], int] = {
+    1: 22, 2: 22, 3: 23, 4: 24, 5: 25, 6: 25, 7: 27, 8: 28, 9: 29, 'fg': 39, 'bg': 49,
+}
+
+# The slots each SGR reset code resets
+_SGR_RESETS: Dict[int, Tuple[Union[int, str], ...]] = {}
+for _slot, _code in _SLOT_RESETS.items():
+    _SGR_RESETS[_code] = _SGR_RESETS.get(_code, ()) + (_slot,)
+del _slot, _code
+
+
+def _slot_order(slot: Union[int, str]) -> Tuple[int, int]:
+    """Sorts the slots of a style: text attributes, colors, then reverse video,
+    like the highlight styles ``1;31;7``
+    """
+    if slot == 'fg':
+        return 1, 0
+    if slot == 'bg':
+        return 1, 1
+    return (2, 0) if slot == 7 else (0, slot)  # type: ignore
+
+
+def _sgr_reset(code: int) -> int:
+    """The SGR code that resets what ``code`` sets"""
+    try:
+        return _SLOT_RESETS[_sgr_slot(code)]
+    except KeyError:
+        raise ValueError('unsupported SGR code: {}'.format(code)) from None
+
+
+class Style:
+    """A precompiled combination of SGR codes.
+
+    Styles compose with ``+`` (or ``|``), the right side wins when both set
+    the same attribute, e.g. two foreground colors. The result renders with
+    one escape sequence as prefix and one minimal reset sequence as suffix,
+    precomputed as ``start``/``end`` for str and ``bstart``/``bend`` for bytes:
+
+    >>> s = bold + yellow + red_bg
+    >>> s('warning') == '\\x1b[1;33;41mwarning\\x1b[22;39;49m'
+    True
+    """
+    __slots__ = ('params', 'start', 'end', 'bstart', 'bend')
+
+    def __init__(self, *codes: int):
+        slots: Dict[Union[int, str], Tuple[int, ...]] = {}
+        for param in _sgr_params(codes):
+            slots[_sgr_slot(param[0])] = param
+        # in a canonical order, so styles setting the same state are equal whatever the order of codes
+        self.params: Tuple[Tuple[int, ...], ...] = tuple(slots[k] for k in sorted(slots, key=_slot_order))
+        if self.params:
+            self.start = esc(*(c for p in self.params for c in p))
+            self.end = esc(*sorted({_sgr_reset(p[0]) for p in self.params}))
+        else:
+            self.start = self.end = ''
+        self.bstart = self.start.encode()
+        self.bend = self.end.encode()
+
+    @property
+    def codes(self) -> Tuple[int, ...]:
+        return tuple(c for p in self.params for c in p)
+
+    @property
+    def slots(self) -> Dict[Union[int, str], Tuple[int, ...]]:
+        """The terminal state this style sets, see ``sgr_apply``"""
+        return {_sgr_slot(p[0]): p for p in self.params}
+
+    def __call__(self, s: AnyStr) -> AnyStr:
+        if not use_color():
+            return s
+
+        # render
+        if isinstance(s, str):
+            return f'{self.start}{s}{self.end}'
+        return self.bstart + s + self.bend
+
+    def __add__(self, other: 'Style') -> 'Style':
+        if not isinstance(other, Style):
+            return NotImplemented
+        return Style(*self.codes, *other.codes)
+
+    __or__ = __add__
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Style):
+            return NotImplemented
+        return self.params == other.params
+
+    def __hash__(self) -> int:
+        return hash(self.params)
+
+    def __repr__(self) -> str:
+        return 'Style({})'.format(', '.join(str(c) for c in self.codes))
+
+
 # According to https://en.wikipedia.org/wiki/ANSI_escape_code#graphics ,
 # 39 is reset for foreground, 49 is reset for background, 0 is reset for all
 # we can use 0 for convenience, but it will make color combination behaves weird.
 END = esc(0)
 
 FG_END = esc(39)
-black = make_color(esc(30), FG_END)
-red = make_color(esc(31), FG_END)
-green = make_color(esc(32), FG_END)
-yellow = make_color(esc(33), FG_END)
-blue = make_color(esc(34), FG_END)
-magenta = make_color(esc(35), FG_END)
-cyan = make_color(esc(36), FG_END)
-white = make_color(esc(37), FG_END)
-
 BG_END = esc(49)
-black_bg = make_color(esc(40), BG_END)
-red_bg = make_color(esc(41), BG_END)
-green_bg = make_color(esc(42), BG_END)
-yellow_bg = make_color(esc(43), BG_END)
-blue_bg = make_color(esc(44), BG_END)
-magenta_bg = make_color(esc(45), BG_END)
-cyan_bg = make_color(esc(46), BG_END)
-white_bg = make_color(esc(47), BG_END)
-
 HL_END = esc(22, 27, 39)
 #HL_END = esc(22, 27, 0)
 
-black_hl = make_color(esc(1, 30, 7), HL_END)
-red_hl = make_color(esc(1, 31, 7), HL_END)
-green_hl = make_color(esc(1, 32, 7), HL_END)
-yellow_hl = make_color(esc(1, 33, 7), HL_END)
-blue_hl = make_color(esc(1, 34, 7), HL_END)
-magenta_hl = make_color(esc(1, 35, 7), HL_END)
-cyan_hl = make_color(esc(1, 36, 7), HL_END)
-white_hl = make_color(esc(1, 37, 7), HL_END)
+# The SGR codes of the named styles, built as ``Style`` on first access
+_NAMED_STYLES: Dict[str, Tuple[int, ...]] = {
+    'black': (30,),
+    'red': (31,),
+    'green': (32,),
+    'yellow': (33,),
+    'blue': (34,),
+    'magenta': (35,),
+    'cyan': (36,),
+    'white': (37,),
+
+    'black_bg': (40,),
+    'red_bg': (41,),
+    'green_bg': (42,),
+    'yellow_bg': (43,),
+    'blue_bg': (44,),
+    'magenta_bg': (45,),
+    'cyan_bg': (46,),
+    'white_bg': (47,),
+
+    'black_hl': (1, 30, 7),
+    'red_hl': (1, 31, 7),
+    'green_hl': (1, 32, 7),
+    'yellow_hl': (1, 33, 7),
+    'blue_hl': (1, 34, 7),
+    'magenta_hl': (1, 35, 7),
+    'cyan_hl': (1, 36, 7),
+    'white_hl': (1, 37, 7),
+
+    'bold': (1,),
+    'italic': (3,),
+    'underline': (4,),
+    'strike': (9,),
+    'blink': (5,),
+}
+
+
+def _named_style_builder(name: str) -> Callable[[], Dict[str, Any]]:
+    return lambda: {name: Style(*_NAMED_STYLES[name])}
+
+
+for _name in _NAMED_STYLES:
+    _LAZY[_name] = _named_style_builder(_name)
+del _name
+
+
+###############################################################################
+# SGR state
+###############################################################################
+#
+# The SGR state of a terminal is kept as a dict of slot -> parameter, where
+# slot is 'fg', 'bg' or the code of a text attribute like 1 (bold), and
+# parameter is a tuple of codes like (31,) or (38, 5, 208).
+
+def sgr_apply(state: Dict, codes: Tuple[int, ...]) -> Dict:
+    """Updates ``state`` with SGR codes in place, like a terminal would, and returns it"""
+    for param in _sgr_params(codes):
+        c = param[0]
+        if c == 0:
+            state.clear()
+        elif c in _SGR_RESETS:
+            for slot in _SGR_RESETS[c]:
+                state.pop(slot, None)
+        else:
+            state[_sgr_slot(c)] = param
+    return state
+
+
+def sgr_diff(a: Mapping, b: Mapping) -> Tuple[int, ...]:
+    """The SGR codes that change terminal state ``a`` to ``b``, empty if they are equal.
+
+    Only attributes that differ are set, and only attributes that ``b`` lacks are reset.
+    """
+    resets: List[int] = []
+    reapply: set = set()
+    for slot in a:
+        if slot in b:
+            continue
+        code = _SLOT_RESETS.get(slot)
+        if code is None:
+            # no known reset code, start over from a full reset
+            return (0,) + tuple(c for p in b.values() for c in p)
+        if code not in resets:
+            resets.append(code)
+            # e.g. 22 resets both bold and dim, the one kept must be set again
+            reapply.update(other for other in _SGR_RESETS[code] if other in b)
+    resets.sort()
+    return tuple(resets) + tuple(c for slot, p in b.items() if slot in reapply or a.get(slot) != p for c in p)
+
+
+@memorize(maxsize=CACHE_MAXSIZE)
+def sgr_transition(a: Optional[Style], b: Optional[Style]) -> str:
+    """The escape sequence that switches from style ``a`` to ``b`` (``None`` for no style)"""
+    codes = sgr_diff(a.slots if a is not None else {}, b.slots if b is not None else {})
+    return esc(*codes) if codes else ''
+
+
+@memorize(maxsize=CACHE_MAXSIZE)
+def sgr_transition_bytes(a: Optional[Style], b: Optional[Style]) -> bytes:
+    """Same as ``sgr_transition``, in bytes"""
+    return sgr_transition(a, b).encode()
+
+
+def render_segments(segments: Any) -> str:
+    """Renders an iterable of ``(style, text)`` pairs with the minimal escape sequences
+    between segments, ``style`` could be ``None`` for plain text.
+    Only the text is joined if ``use_color()`` is false.
+    """
+    if not use_color():
+        return ''.join(text for _, text in segments)
+    parts = []
+    current = None
+    for style, text in segments:
+        if not text:
+            continue
+        if style != current:
+            parts.append(sgr_transition(current, style))
+            current = style
+        parts.append(text)
+    if current is not None:
+        parts.append(current.end)
+    return ''.join(parts)
+
+
+def minimize_sgr(s: str) -> str:
+    """Rewrites the SGR sequences of ``s`` to emit only the state changes before each run of text.
+
+    Adjacent sequences are merged and redundant codes dropped, e.g. ``red('a') + green('b')``,
+    which is ``\\x1b[31ma\\x1b[39m\\x1b[32mb\\x1b[39m``, becomes ``\\x1b[31ma\\x1b[32mb\\x1b[39m``.
+    The terminal state at every character of text is unchanged.
+    """
+    if '\x1b[' not in s:
+        return s
+    out = []
+    state: Dict = {}
+    shown: Dict = {}
+    n = len(s)
+    pos = text_start = 0
+    while True:
+        i = s.find('\x1b[', pos)
+        if i < 0:
+            break
+        j = i + 2
+        while j < n and s[j] in '0123456789;':
+            j += 1
+        if j >= n or s[j] != 'm':
+            # not a SGR sequence, keep it as text
+            pos = i + 2
+            continue
+        if i > text_start:
+            if state != shown:
+                out.append(esc(*sgr_diff(shown, state)))
+                shown = dict(state)
+            out.append(s[text_start:i])
+        sgr_apply(state, tuple(int(c) if c else 0 for c in s[i + 2:j].split(';')))
+        pos = text_start = j + 1
+    if n > text_start:
+        if state != shown:
+            out.append(esc(*sgr_diff(shown, state)))
+            shown = dict(state)
+        out.append(s[text_start:])
+    if state != shown:
+        out.append(esc(*sgr_diff(shown, state)))
+    return ''.join(out)
+
+
+###############################################################################
+# Style registry
+###############################################################################
+
+# The SGR codes of a xterm color on each layer, like fg256, bg256 and hl256
+_LAYER_CODES: Dict[str, Callable[[int], Tuple[int, ...]]] = {
+    'fg': lambda x: (38, 5, x),
+    'bg': lambda x: (48, 5, x),
+    'hl': lambda x: (1, 38, 5, x, 7),
+}
+
+
+class StyleRegistry:
+    """Interns styles to small integer ids, so that renderers, buffers and caches
+    could keep an int per segment instead of a style or its escape sequences.
+
+    Id 0 is no style. ``styles``, ``starts``, ``ends``, ``bstarts`` and ``bends``
+    are lists indexed by id, of the styles and their str and bytes escape sequences.
+    Ids are never reused, and interning is safe from many threads.
+
+    >>> sid = style_registry.intern(bold + red)
+    >>> style_registry.starts[sid] + 'error' + style_registry.ends[sid]
+    """
+
+    def __init__(self) -> None:
+        self.styles: List[Optional[Style]] = [None]
+        self.starts: List[str] = ['']
+        self.ends: List[str] = ['']
+        self.bstarts: List[bytes] = [b'']
+        self.bends: List[bytes] = [b'']
+        self._ids: Dict[Style, int] = {}
+        self._xterm_ids: Dict[Tuple[str, int], int] = {}
+        # (id, id) -> transition
+        self._transitions: Dict[Tuple[int, int], str] = {}
+        self._btransitions: Dict[Tuple[int, int], bytes] = {}
+        self._lock = _thread.allocate_lock()
+
+    def intern(self, style: Optional[Style]) -> int:
+        """Returns the id of a style, adding it on first use"""
+        if style is None:
+            return 0
+        try:
+            return self._ids[style]
+        except KeyError:
+            pass
+        with self._lock:
+            sid = self._ids.get(style)
+            if sid is None:
+                sid = len(self.styles)
+                self.styles.append(style)
+                self.starts.append(style.start)
+                self.ends.append(style.end)
+                self.bstarts.append(style.bstart)
+                self.bends.append(style.bend)
+                # published last, so that the lists are filled for whoever gets the id
+                self._ids[style] = sid
+        return sid
+
+    def xterm(self, x: int, layer: str = 'fg') -> int:
+        """Returns the id of a xterm-256 color style, ``layer`` is ``'fg'``, ``'bg'`` or ``'hl'``"""
+        key = (layer, x)
+        try:
+            return self._xterm_ids[key]
+        except KeyError:
+            pass
+        try:
+            codes = _LAYER_CODES[layer]
+        except KeyError:
+            raise ValueError('layer must be fg, bg or hl') from None
+        sid = self._xterm_ids[key] = self.intern(Style(*codes(x)))
+        return sid
+
+    def transition(self, a: int, b: int) -> str:
+        """The escape sequence that switches from style id ``a`` to ``b``, see ``sgr_transition``"""
+        try:
+            return self._transitions[a, b]
+        except KeyError:
+            seq = self._transitions[a, b] = sgr_transition(self.styles[a], self.styles[b])
+            return seq
+
+    def btransition(self, a: int, b: int) -> bytes:
+        """Same as ``transition``, in bytes"""
+        try:
+            return self._btransitions[a, b]
+        except KeyError:
+            seq = self._btransitions[a, b] = self.transition(a, b).encode()
+            return seq
+
+    def __getitem__(self, sid: int) -> Optional[Style]:
+        return self.styles[sid]
+
+    def __len__(self) -> int:
+        return len(self.styles)
+
+
+# The registry shared by renderers
+style_registry = StyleRegistry()
+
+
+###############################################################################
+# Visible width
+###############################################################################
+
+# CSI sequences (which SGR is one of), OSC sequences like hyperlinks, charset
+# designations like ESC ( B, and two character escapes like ESC 7.
+# Compiled on first use to keep ``re`` out of import time.
+_ANSI_PATTERN = r'\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[ -/]+[0-~]|[0-~])'
+_ansi_re: Any = None
+
+# Character -> terminal column width, filled for non ASCII characters as they are seen
+_char_widths: Dict[str, int] = {}
+
+
+def strip_ansi(s: str) -> str:
+    """Removes ANSI escape sequences from ``s``"""
+    global _ansi_re
+    if '\x1b' not in s:
+        return s
+    if _ansi_re is None:
+        import re
+        _ansi_re = re.compile(_ANSI_PATTERN)
+    return _ansi_re.sub('', s)
+
+
+def _char_width(c: str) -> int:
+    import unicodedata
+
+    if unicodedata.combining(c) or unicodedata.category(c) in ('Mn', 'Me', 'Cf'):
+        w = 0
+    elif unicodedata.east_asian_width(c) in ('W', 'F'):
+        w = 2
+    else:
+        w = 1
+    _char_widths[c] = w
+    return w
+
+
+def text_width(s: str) -> int:
+    """The number of terminal columns ``s`` takes, East Asian wide characters take 2.
+    ``s`` must not contain escape sequences, see ``visible_len``.
+    """
+    if s.isascii():
+        return len(s)
+    widths = _char_widths
+    width = 0
+    for c in s:
+        w = widths.get(c)
+        if w is None:
+            w = _char_width(c)
+        width += w
+    return width
+
+
+def text_cut(s: str, width: int) -> int:
+    """The index in ``s`` where it exceeds ``width`` columns, or its length,
+    ``s[:text_cut(s, width)]`` is the longest prefix that fits.
+    """
+    if s.isascii():
+        return min(max(width, 0), len(s))
+    used = 0
+    for i, c in enumerate(s):
+        used += text_width(c)
+        if used > width:
+            return i
+    return len(s)
+
+
+# What ``truncate`` of ``color_table`` and ``color_text`` end a cut text with
+ELLIPSIS = '…'
+
+
+def visible_len(s: str) -> int:
+    """The number of terminal columns a colored string takes"""
+    return text_width(strip_ansi(s))
+
+
+def ljust(s: str, width: int, fillchar: str = ' ') -> str:
+    """Like ``str.ljust``, but measures the visible width of a colored string"""
+    return s + fillchar * (width - visible_len(s))
 
-bold = make_color(esc(1), esc(22))
-italic = make_color(esc(3), esc(23))
-underline = make_color(esc(4), esc(24))
-strike = make_color(esc(9), esc(29))
-blink = make_color(esc(5), esc(25))
+
+def rjust(s: str, width: int, fillchar: str = ' ') -> str:
+    """Like ``str.rjust``, but measures the visible width of a colored string"""
+    return fillchar * (width - visible_len(s)) + s
+
+
+def center(s: str, width: int, fillchar: str = ' ') -> str:
+    """Like ``str.center``, but measures the visible width of a colored string"""
+    pad = width - visible_len(s)
+    if pad <= 0:
+        return s
+    # same as str.center, which puts the odd fill char on the left for odd widths
+    left = pad // 2 + (pad & width & 1)
+    return fillchar * left + s + fillchar * (pad - left)
 
 
 ###############################################################################
@@ -180,8 +982,6 @@ blink = make_color(esc(5), esc(25))
 #
 # Rewrite from: https://gist.github.com/MicahElliott/719710
 
-import re  # NOQA
-
 # Default color levels for the color cube
 CUBELEVELS: List[int] = [0x00, 0x5f, 0x87, 0xaf, 0xd7, 0xff]
 
@@ -237,81 +1037,782 @@ class Memorize(dict):
         return result
 
 
-def memorize(func) -> Callable:
-    func._cache = {}
+# Per channel value lookups: the color cube index of a channel, and the xterm
+# color of a gray with all channels equal to the value
+# (values up to SNAPS[0] are index 0, up to SNAPS[1] are index 1, ...)
+_CUBE_INDEX = b''.join(bytes([i]) * (hi - lo) for i, (lo, hi) in enumerate(zip([-1] + SNAPS, SNAPS + [255])))
+# the grays are 10 apart from 0x08, rounding halves down like get_closest does
+_GRAY_XTERM = bytes(232 + min(max((v - 4) // 10, 0), 23) for v in range(256))
 
-    def wrapper(*args, **kwargs):
-        if kwargs:
-            return func(*args, **kwargs)
-        if args not in func._cache:
-            func._cache[args] = func(*args, **kwargs)
-        return func._cache[args]
 
-    for i in ('__module__', '__name__', '__doc__'):
-        setattr(wrapper, i, getattr(func, i))
-    wrapper.__dict__.update(getattr(func, '__dict__', {}))  # type: ignore
-    wrapper._origin = func  # type: ignore
-    return wrapper
-
-
-@memorize
+@memorize(maxsize=CACHE_MAXSIZE)
 def rgb_to_xterm(r: int, g: int, b: int) -> int:
     """ Converts RGB values to the nearest equivalent xterm-256 color.
     """
-    if r == g == b:
-        # use gray scale
-        gs = get_closest(r, GRAYSCALE_POINTS)
-        return GRAYSCALE[gs]
-    # Using list of snap points, convert RGB value to cube indexes
-    r, g, b = map(lambda x: len(tuple(s for s in SNAPS if s < x)), (r, g, b))
-    # Simple colorcube transform
-    return r * 36 + g * 6 + b + 16
-
-
-@memorize
-def hex_to_rgb(hx: str) -> Tuple[int, int, int]:
+    if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+        raise ValueError('rgb values must be in range 0 to 255')
+    try:
+        if r == g == b:
+            # use gray scale
+            return _GRAY_XTERM[r]
+        # Simple colorcube transform
+        ci = _CUBE_INDEX
+        return ci[r] * 36 + ci[g] * 6 + ci[b] + 16
+    except TypeError:
+        # float values, truncated to int
+        return rgb_to_xterm(int(r), int(g), int(b))
+
+
+_xterm_table: Optional[Any] = None
+
+XTERM_TABLE_SIZE = 1 << 24
+
+
+def _build_xterm_table() -> bytearray:
+    ci = _CUBE_INDEX
+    # a row holds the colors of all blue values for a (red, green) cube index pair,
+    # so there are only 36 distinct rows and 6 distinct (green, blue) blocks.
+    rows = [bytes(16 + rg * 6 + ci[b] for b in range(256)) for rg in range(36)]
+    blocks = [b''.join(rows[ri * 6 + ci[g]] for g in range(256)) for ri in range(6)]
+    table = bytearray(b''.join(blocks[ci[r]] for r in range(256)))
+    for v in range(256):
+        table[(v << 16) | (v << 8) | v] = _GRAY_XTERM[v]
+    return table
+
+
+def _load_xterm_table(path: str) -> Any:
+    import mmap
+
+    if not os.path.exists(path) or os.path.getsize(path) != XTERM_TABLE_SIZE:
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(_build_xterm_table())
+        os.replace(tmp, path)
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def xterm_table(path: Optional[str] = None) -> Any:
+    """Returns the full RGB to xterm-256 lookup table, built on first call.
+
+    The table has one byte per RGB color, indexed by ``r << 16 | g << 8 | b``,
+    16 MiB in total. If ``path`` is given, the table is saved to the file
+    (when it does not exist yet) and memory mapped from it, so that processes
+    can share it instead of building their own. Once a table is built or
+    loaded, ``path`` is ignored until ``reset_xterm_table()`` is called.
+
+    :rtype: bytearray, or mmap.mmap if ``path`` is given
+    """
+    global _xterm_table
+    if _xterm_table is None:
+        if path is None:
+            _xterm_table = _build_xterm_table()
+        else:
+            _xterm_table = _load_xterm_table(path)
+    return _xterm_table
+
+
+def reset_xterm_table():
+    """Releases the lookup table built by ``xterm_table()``"""
+    global _xterm_table
+    _xterm_table = None
+
+
+def rgb_to_xterm_lut(r: int, g: int, b: int) -> int:
+    """ Same as ``rgb_to_xterm``, but looks up the full table from ``xterm_table()``
+    instead of caching each color, for callers that see millions of distinct colors.
+    """
+    if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+        raise ValueError('rgb values must be in range 0 to 255')
+    table = _xterm_table
+    if table is None:
+        table = xterm_table()
+    try:
+        return table[(r << 16) | (g << 8) | b]
+    except TypeError:
+        # float values, truncated to int
+        return table[(int(r) << 16) | (int(g) << 8) | int(b)]
+
+
+_HEXDIGITS = '0123456789abcdefABCDEF'
+_HEXDIGITS_B = _HEXDIGITS.encode()
+
+
+@memorize(maxsize=CACHE_MAXSIZE)
+def hex_to_rgb(hx: Union[str, bytes]) -> Tuple[int, int, int]:
+    """ Parses a hex color string to an (R, G, B) tuple.
+
+    Accepts str or bytes of 3, 6 or 8 (alpha is ignored) hex digits,
+    optionally prefixed by ``#``, e.g. ``555``, ``#912D2B``, ``912D2BFF``.
+    """
+    invalid: Union[str, bytes]
+    if isinstance(hx, str):
+        if hx[:1] == '#':
+            hx = hx[1:]
+        invalid = hx.lstrip(_HEXDIGITS)
+    else:
+        if hx[:1] == b'#':
+            hx = hx[1:]
+        invalid = hx.lstrip(_HEXDIGITS_B)
     hxlen = len(hx)
-    if hxlen != 3 and hxlen != 6:
-        raise ValueError('hx color must be of length 3 or 6')
+    if hxlen != 6 and hxlen != 3 and hxlen != 8:
+        raise ValueError('hx color must be of length 3, 6 or 8')
+    if invalid:
+        raise ValueError('hx color must only contain hex digits')
+
+    v = int(hx, 16)
     if hxlen == 3:
-        hx = t_('').join(i * 2 for i in hx)
-    parts = [int(h, 16) for h in re.split(t_(r'(..)(..)(..)'), hx)[1:4]]
-    return tuple(parts)  # type: ignore
+        return (v >> 8) * 17, ((v >> 4) & 0xf) * 17, (v & 0xf) * 17
+    if hxlen == 8:
+        v >>= 8
+    return v >> 16, (v >> 8) & 0xff, v & 0xff
+
+
+###############################################################################
+# Batch conversion (requires numpy)
+###############################################################################
+
+def _numpy() -> Any:
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        raise ImportError('numpy is required for batch color conversion') from None
+    return numpy
+
 
+@_lazy('_HEX_NIBBLES')
+def _build_hex_nibbles() -> Dict[str, Any]:
+    # ASCII code -> hex digit value, 0xff for non hex digits
+    return {'_HEX_NIBBLES': bytes(int(chr(c), 16) if chr(c) in _HEXDIGITS else 0xff for c in range(256))}
 
-def make_256(start: str, end: str) -> Callable[[Union[tuple, str], str, Optional[Tuple[int, int, int]]], str]:
-    def rgb_func(rgb: Union[tuple, str], s: str, x: Optional[Tuple[int, int, int]] = None) -> str:
+
+def rgb_to_xterm_array(rgb: Any) -> Any:
+    """Converts an array of RGB colors to xterm-256 colors at once, same as ``rgb_to_xterm``.
+
+    :param rgb: array like of shape ``(..., 3)``, e.g. ``(N, 3)`` or ``(height, width, 3)``
+    :return: uint8 numpy array of shape ``(...)``
+    :raises ValueError: If the shape is not ``(..., 3)`` or a value is out of 0 to 255.
+    """
+    np = _numpy()
+    arr = np.asarray(rgb)
+    if arr.ndim < 1 or arr.shape[-1] != 3:
+        raise ValueError('rgb array must be of shape (..., 3)')
+    if arr.dtype != np.uint8:
+        if arr.size and (arr.min() < 0 or arr.max() > 255):
+            raise ValueError('rgb values must be in range 0 to 255')
+        arr = arr.astype(np.uint8)
+
+    r, g, b = arr[..., 0], arr[..., 1], arr[..., 2]
+    # snap each channel to the cube with the per channel lookups built from SNAPS
+    cube = np.frombuffer(_CUBE_INDEX, dtype=np.uint8)
+    xterm = cube[r] * 36 + cube[g] * 6 + cube[b] + 16
+    gray = (r == g) & (g == b)
+    xterm[gray] = np.frombuffer(_GRAY_XTERM, dtype=np.uint8)[r[gray]]
+    return xterm
+
+
+def hex_to_rgb_array(hexes: Any) -> Any:
+    """Parses a sequence of hex color strings at once, accepts the same forms as ``hex_to_rgb``.
+
+    :return: uint8 numpy array of shape ``(N, 3)``
+    :raises ValueError: If a hex color is invalid.
+    """
+    np = _numpy()
+    full = []
+    for hx in hexes:
+        hx = t_(hx)
+        if hx[:1] == '#':
+            hx = hx[1:]
+        hxlen = len(hx)
+        # all padded to 8 digits, the alpha is checked like hex_to_rgb does, then dropped
+        if hxlen == 3:
+            hx = hx[0] * 2 + hx[1] * 2 + hx[2] * 2 + '00'
+        elif hxlen == 6:
+            hx += '00'
+        elif hxlen != 8:
+            raise ValueError('hx color must be of length 3, 6 or 8')
+        full.append(hx)
+    try:
+        data = ''.join(full).encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError('invalid hex color') from None
+
+    nibbles = np.frombuffer(__getattr__('_HEX_NIBBLES'), dtype=np.uint8)[np.frombuffer(data, dtype=np.uint8)]
+    if (nibbles == 0xff).any():
+        raise ValueError('invalid hex color')
+    nibbles = nibbles.reshape(-1, 4, 2)[:, :3]
+    return (nibbles[..., 0] << 4) | nibbles[..., 1]
+
+
+def hex_to_xterm_array(hexes: Any) -> Any:
+    """Converts a sequence of hex color strings to xterm-256 colors at once
+
+    :return: uint8 numpy array of shape ``(N,)``
+    """
+    return rgb_to_xterm_array(hex_to_rgb_array(hexes))
+
+
+def make_256(start: str, end: str) -> Callable[[Union[tuple, str], AnyStr, Optional[int]], AnyStr]:
+    """Makes a 256 color function, ``start`` is formatted with ``x`` as the xterm color
+    once for each of the 256 colors, so rendering is ``prefixes[x] + s + end``.
+
+    The returned function has ``prefixes`` (tuple of the 256 escape prefixes) and
+    ``end`` attributes, and ``bprefixes``/``bend`` of bytes,
+    for callers that build output themselves.
+    """
+    prefixes = tuple(start.format(x=i) for i in range(256))
+    bprefixes = tuple(p.encode() for p in prefixes)
+    bend = end.encode()
+
+    def rgb_func(rgb, s, x=None):
         """
         :param rgb: (R, G, B) tuple, or RRGGBB hex string
+        :param x: xterm color to use instead of converting ``rgb``
         """
         if not use_color():
             return s
 
-        t = t_(s)
+        # render
+        if x is None:
+            if not isinstance(rgb, tuple):
+                rgb = hex_to_rgb(rgb)
+            x = rgb_to_xterm(*rgb)
+
+        if isinstance(s, bytes):
+            return bprefixes[x] + s + bend
+        return f'{prefixes[x]}{s}{end}'
+
+    rgb_func.prefixes = prefixes  # type: ignore
+    rgb_func.end = end  # type: ignore
+    rgb_func.bprefixes = bprefixes  # type: ignore
+    rgb_func.bend = bend  # type: ignore
+    return rgb_func
+
+
+@_lazy('fg256', 'bg256', 'hl256', 'FG256_PREFIXES', 'BG256_PREFIXES', 'HL256_PREFIXES', 'HL256_END',
+       'FG256_PREFIXES_B', 'BG256_PREFIXES_B', 'HL256_PREFIXES_B')
+def _build_256() -> Dict[str, Any]:
+    fg256 = make_256(esc(38, 5, '{x}'), esc(39))
+    bg256 = make_256(esc(48, 5, '{x}'), esc(49))
+    hl256 = make_256(esc(1, 38, 5, '{x}', 7), esc(27, 39, 22))
+    return {
+        'fg256': fg256,
+        'bg256': bg256,
+        'hl256': hl256,
+        # The escape prefixes of each xterm color, indexed by the color
+        'FG256_PREFIXES': fg256.prefixes,  # type: ignore
+        'BG256_PREFIXES': bg256.prefixes,  # type: ignore
+        'HL256_PREFIXES': hl256.prefixes,  # type: ignore
+        'HL256_END': hl256.end,  # type: ignore
+        'FG256_PREFIXES_B': fg256.bprefixes,  # type: ignore
+        'BG256_PREFIXES_B': bg256.bprefixes,  # type: ignore
+        'HL256_PREFIXES_B': hl256.bprefixes,  # type: ignore
+    }
+
+
+_grayscale_xterm_codes = [i for _, i in _GRAYSCALE]
+
+
+@_lazy('grayscale')
+def _build_grayscale() -> Dict[str, Any]:
+    return {'grayscale': {(i - _grayscale_xterm_codes[0]): Style(38, 5, i) for i in _grayscale_xterm_codes}}
+
+
+@_lazy('grayscale_bg')
+def _build_grayscale_bg() -> Dict[str, Any]:
+    return {'grayscale_bg': {(i - _grayscale_xterm_codes[0]): Style(48, 5, i) for i in _grayscale_xterm_codes}}
+
+
+@_lazy('grayscale_hl')
+def _build_grayscale_hl() -> Dict[str, Any]:
+    return {'grayscale_hl': {(i - _grayscale_xterm_codes[0]): Style(1, 38, 5, i, 7) for i in _grayscale_xterm_codes}}
+
+
+###############################################################################
+# Truecolor, downsampled by color level
+###############################################################################
+
+# xterm's default RGB values of the 16 system colors
+ANSI16_RGB: List[Tuple[int, int, int]] = [
+    (0x00, 0x00, 0x00), (0x80, 0x00, 0x00), (0x00, 0x80, 0x00), (0x80, 0x80, 0x00),
+    (0x00, 0x00, 0x80), (0x80, 0x00, 0x80), (0x00, 0x80, 0x80), (0xc0, 0xc0, 0xc0),
+    (0x80, 0x80, 0x80), (0xff, 0x00, 0x00), (0x00, 0xff, 0x00), (0xff, 0xff, 0x00),
+    (0x00, 0x00, 0xff), (0xff, 0x00, 0xff), (0x00, 0xff, 0xff), (0xff, 0xff, 0xff),
+]
+
+
+@memorize(maxsize=CACHE_MAXSIZE)
+def rgb_to_ansi16(r: int, g: int, b: int) -> int:
+    """ Converts RGB values to the nearest of the 16 system colors, returns 0 to 15.
+    """
+    return min(range(16), key=lambda i: (
+        (ANSI16_RGB[i][0] - r) ** 2 + (ANSI16_RGB[i][1] - g) ** 2 + (ANSI16_RGB[i][2] - b) ** 2))
+
+
+def make_truecolor(layer: int, bold: bool, end: str) -> Callable[[Union[tuple, str], AnyStr], AnyStr]:
+    """Makes a function that renders 24 bit color if the terminal supports it,
+    otherwise the nearest 256 color or 16 color.
+
+    :param layer: 38 for foreground, 48 for background
+    :param bold: highlight the color with bold and reverse like ``hl256``
+    """
+    pre = '1;' if bold else ''
+    post = ';7' if bold else ''
+    pre_ext = '{}{};'.format(pre, layer)
+    # 16 color codes: 30-37 and 90-97 for foreground, 40-47 and 100-107 for background
+    prefixes16 = tuple('\x1b[{}{}{}m'.format(pre, layer - 8 + i if i < 8 else layer + 52 + i - 8, post)
+                       for i in range(16))
+    prefixes256 = tuple('\x1b[{}5;{}{}m'.format(pre_ext, i, post) for i in range(256))
+    bprefixes16 = tuple(p.encode() for p in prefixes16)
+    bprefixes256 = tuple(p.encode() for p in prefixes256)
+    bpre_ext, bpost, bend = pre_ext.encode(), post.encode(), end.encode()
+
+    def rgb_func(rgb, s):
+        """
+        :param rgb: (R, G, B) tuple, or RRGGBB hex string
+        """
+        support = _context_support.get()
+        if support is None:
+            support = _support
+            if support is None or support.stream is not sys.stdout:
+                support = _resolve_color_support()
+        if not support.enabled:
+            return s
+
+        if isinstance(rgb, tuple):
+            r, g, b = rgb
+        else:
+            r, g, b = hex_to_rgb(rgb)
 
         # render
-        if not isinstance(rgb, tuple):
-            rgb = hex_to_rgb(t_(rgb))
-        if x is not None:
-            xcolor = x
+        level = support.level
+        if isinstance(s, bytes):
+            if level == COLOR_TRUE:
+                return b'\x1b[%b2;%d;%d;%d%bm%b%b' % (bpre_ext, r, g, b, bpost, s, bend)
+            if level == COLOR_256:
+                return bprefixes256[rgb_to_xterm(r, g, b)] + s + bend
+            return bprefixes16[rgb_to_ansi16(r, g, b)] + s + bend
+        if level == COLOR_TRUE:
+            return f'\x1b[{pre_ext}2;{r};{g};{b}{post}m{s}{end}'
+        if level == COLOR_256:
+            return f'{prefixes256[rgb_to_xterm(r, g, b)]}{s}{end}'
+        return f'{prefixes16[rgb_to_ansi16(r, g, b)]}{s}{end}'
+
+    return rgb_func
+
+
+@_lazy('fgtrue', 'bgtrue', 'hltrue')
+def _build_truecolor() -> Dict[str, Any]:
+    return {
+        'fgtrue': make_truecolor(38, False, esc(39)),
+        'bgtrue': make_truecolor(48, False, esc(49)),
+        'hltrue': make_truecolor(38, True, esc(27, 39, 22)),
+    }
+
+
+###############################################################################
+# Perceptual matching
+###############################################################################
+#
+# ``rgb_to_xterm`` snaps each channel to the cube on its own, which is cheap
+# but only considers the cube and the diagonal grays. The functions below find
+# the nearest of all the 256 colors by distance in OKLab
+# (https://bottosson.github.io/posts/oklab/), through a k-d tree over the palette.
+
+@_lazy('XTERM_PALETTE')
+def _build_xterm_palette() -> Dict[str, Any]:
+    cube = [(r, g, b) for r in CUBELEVELS for g in CUBELEVELS for b in CUBELEVELS]
+    grays = [(v, v, v) for v in GRAYSCALE_POINTS]
+    # The RGB values of the xterm colors, indexed by the color
+    return {'XTERM_PALETTE': tuple(ANSI16_RGB) + tuple(cube) + tuple(grays)}
+
+
+@_lazy('_SRGB_LINEAR')
+def _build_srgb_linear() -> Dict[str, Any]:
+    def linear(c):
+        c /= 255
+        return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+    return {'_SRGB_LINEAR': tuple(linear(v) for v in range(256))}
+
+
+def rgb_to_oklab(r: int, g: int, b: int) -> Tuple[float, float, float]:
+    """ Converts sRGB values to an OKLab (L, a, b) tuple.
+    """
+    lin = __getattr__('_SRGB_LINEAR')
+    r, g, b = lin[r], lin[g], lin[b]
+    l_ = (0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b) ** (1 / 3)
+    m_ = (0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b) ** (1 / 3)
+    s_ = (0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b) ** (1 / 3)
+    return (
+        0.2104542553 * l_ + 0.7936177850 * m_ - 0.0040720468 * s_,
+        1.9779984951 * l_ - 2.4285922050 * m_ + 0.4505937099 * s_,
+        0.0259040371 * l_ + 0.7827717662 * m_ - 0.8086757660 * s_,
+    )
+
+
+def _kd_build(points: list, depth: int = 0) -> Optional[tuple]:
+    if not points:
+        return None
+    axis = depth % 3
+    points.sort(key=lambda p: p[0][axis])
+    mid = len(points) // 2
+    lab, x = points[mid]
+    # node: (L, a, b, xterm color, axis, left, right)
+    return (lab[0], lab[1], lab[2], x, axis,
+            _kd_build(points[:mid], depth + 1), _kd_build(points[mid + 1:], depth + 1))
+
+
+@_lazy('_XTERM_KDTREE')
+def _build_xterm_kdtree() -> Dict[str, Any]:
+    palette = __getattr__('XTERM_PALETTE')
+    points = []
+    seen = set()
+    # The cube and the grays come first, so that the system colors, which
+    # terminal themes often change, are only used when they are not duplicates.
+    for x in list(range(16, 256)) + list(range(16)):
+        if palette[x] not in seen:
+            seen.add(palette[x])
+            points.append((rgb_to_oklab(*palette[x]), x))
+    return {'_XTERM_KDTREE': _kd_build(points)}
+
+
+@_lazy('_XTERM_OKLAB')
+def _build_xterm_oklab() -> Dict[str, Any]:
+    # The OKLab values of the xterm colors, indexed by the color
+    return {'_XTERM_OKLAB': tuple(rgb_to_oklab(*rgb) for rgb in __getattr__('XTERM_PALETTE'))}
+
+
+def _nearest_oklab(p: Tuple[float, float, float]) -> int:
+    """The xterm color nearest to OKLab values, by the k-d tree"""
+    p0, p1, p2 = p
+    best_d = float('inf')
+    best = 0
+    stack = [(__getattr__('_XTERM_KDTREE'), 0.0)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node, bound = pop()
+        if node is None or bound >= best_d:
+            continue
+        n0, n1, n2, x, axis, left, right = node
+        d = (p0 - n0) ** 2 + (p1 - n1) ** 2 + (p2 - n2) ** 2
+        if d < best_d:
+            best_d = d
+            best = x
+        diff = p[axis] - node[axis]
+        # visit the near side first, the far side only if the splitting plane is
+        # closer than the best match so far
+        if diff < 0:
+            push((right, diff * diff))
+            push((left, 0.0))
         else:
-            xcolor = rgb_to_xterm(*rgb)
+            push((left, diff * diff))
+            push((right, 0.0))
+    return best
 
-        tpl = start + t_('{s}') + end
-        f = tpl.format(
-            x=xcolor,
-            s=t)
 
-        return f
+# The RGB cube is split into cells of 4 x 4 x 4 values, each holding the palette
+# colors that could be the nearest to a color in it, found on first use
+_CELL_BITS = 2
+_CELLS = 256 >> _CELL_BITS
+_CELL_MARGIN = 0.002
 
-    return rgb_func
 
+@_lazy('_PERCEPTUAL_CELLS')
+def _build_perceptual_cells() -> Dict[str, Any]:
+    return {'_PERCEPTUAL_CELLS': [None] * _CELLS ** 3}
 
-fg256 = make_256(esc(38, 5, t_('{x}')), esc(39))
-bg256 = make_256(esc(48, 5, t_('{x}')), esc(49))
-hl256 = make_256(esc(1, 38, 5, t_('{x}'), 7), esc(27, 39, 22))
 
-_grayscale_xterm_codes = [i for _, i in _GRAYSCALE]
-grayscale = {(i - _grayscale_xterm_codes[0]): make_color(esc(38, 5, i), esc(39)) for i in _grayscale_xterm_codes}
-grayscale_bg = {(i - _grayscale_xterm_codes[0]): make_color(esc(48, 5, i), esc(49)) for i in _grayscale_xterm_codes}
-grayscale_hl = {(i - _grayscale_xterm_codes[0]): make_color(esc(1, 38, 5, i, 7), esc(27, 39, 22)) for i in _grayscale_xterm_codes}
+def _cell_candidates(cr: int, cg: int, cb: int) -> Any:
+    """The xterm colors that could be the nearest to a color of a cell, an int if only
+    one could be, else a tuple of (L, a, b, xterm color)
+    """
+    step = (1 << _CELL_BITS) - 1
+    r, g, b = cr << _CELL_BITS, cg << _CELL_BITS, cb << _CELL_BITS
+    # OKLab is close to linear over a cell, its image is within the box of the
+    # OKLab values of its corners, widened a little for the curvature
+    corners = [rgb_to_oklab(r + i, g + j, b + k) for i in (0, step) for j in (0, step) for k in (0, step)]
+    lo0, lo1, lo2 = [min(c[i] for c in corners) - _CELL_MARGIN for i in range(3)]
+    hi0, hi1, hi2 = [max(c[i] for c in corners) + _CELL_MARGIN for i in range(3)]
+    box_lo = lo0, lo1, lo2
+    box_hi = hi0, hi1, hi2
+
+    def far(n0, n1, n2):
+        return (max(((n0 - c0) ** 2 + (n1 - c1) ** 2 + (n2 - c2) ** 2) ** 0.5
+                    for c0, c1, c2 in corners) + _CELL_MARGIN) ** 2
+
+    # The colors whose nearest distance to the cell could be less than the
+    # farthest distance of the color nearest to the cell center
+    center = rgb_to_oklab(r + step // 2, g + step // 2, b + step // 2)
+    best = far(*__getattr__('_XTERM_OKLAB')[_nearest_oklab(center)])
+    found = []
+    stack = [__getattr__('_XTERM_KDTREE')]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        n0, n1, n2, x, axis, left, right = node
+        near = ((lo0 - n0 if n0 < lo0 else n0 - hi0 if n0 > hi0 else 0.0) ** 2
+                + (lo1 - n1 if n1 < lo1 else n1 - hi1 if n1 > hi1 else 0.0) ** 2
+                + (lo2 - n2 if n2 < lo2 else n2 - hi2 if n2 > hi2 else 0.0) ** 2)
+        if near <= best:
+            found.append((n0, n1, n2, x))
+        split = node[axis]
+        # the left side has values up to the split, the right side from it
+        if box_lo[axis] <= split or (box_lo[axis] - split) ** 2 <= best:
+            stack.append(left)
+        if box_hi[axis] >= split or (split - box_hi[axis]) ** 2 <= best:
+            stack.append(right)
+
+    # Of those, drop the ones another is nearer than over the whole cell. Which
+    # of two colors is nearer is split by a plane, so checking the corners is
+    # enough, with room for the curvature.
+    def dominated(q):
+        for p in found:
+            if p is q:
+                continue
+            # |x - q|^2 - |x - p|^2 = 2 x.(p - q) + |q|^2 - |p|^2
+            d0, d1, d2 = p[0] - q[0], p[1] - q[1], p[2] - q[2]
+            k = q[0] ** 2 + q[1] ** 2 + q[2] ** 2 - p[0] ** 2 - p[1] ** 2 - p[2] ** 2
+            room = 2 * _CELL_MARGIN * (d0 * d0 + d1 * d1 + d2 * d2) ** 0.5
+            if all(2 * (c0 * d0 + c1 * d1 + c2 * d2) + k > room for c0, c1, c2 in corners):
+                return True
+        return False
+
+    candidates = tuple(q for q in found if not dominated(q))
+    return candidates[0][3] if len(candidates) == 1 else candidates
+
+
+@memorize(maxsize=CACHE_MAXSIZE)
+def rgb_to_xterm_perceptual(r: int, g: int, b: int) -> int:
+    """ Converts RGB values to the perceptually nearest xterm-256 color,
+    considering the 16 system colors and all the grays too.
+
+    A miss looks up the cell of the color in a coarse grid, most cells have a
+    single candidate, the others a few to compare in OKLab.
+    """
+    if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+        raise ValueError('rgb values must be in range 0 to 255')
+    cr, cg, cb = r >> _CELL_BITS, g >> _CELL_BITS, b >> _CELL_BITS
+    cells = __getattr__('_PERCEPTUAL_CELLS')
+    i = (cr * _CELLS + cg) * _CELLS + cb
+    candidates = cells[i]
+    if candidates is None:
+        candidates = cells[i] = _cell_candidates(cr, cg, cb)
+    if candidates.__class__ is int:
+        return candidates
+    p0, p1, p2 = rgb_to_oklab(r, g, b)
+    best_d = float('inf')
+    best = 0
+    for n0, n1, n2, x in candidates:
+        d = (p0 - n0) ** 2 + (p1 - n1) ** 2 + (p2 - n2) ** 2
+        if d < best_d:
+            best_d = d
+            best = x
+    return best
+
+
+###############################################################################
+# Gradients
+###############################################################################
+
+class Gradient:
+    """A color ramp of ``steps`` xterm-256 colors, interpolated once between ``colors``.
+
+    Each step is a precompiled ``Style``, adjacent steps that snap to the same
+    xterm color share one ``Style`` object, and ``runs`` holds the
+    ``(style, count)`` pairs of them, so rendering is only string joins.
+
+    >>> g = Gradient(['00ff00', 'ffff00', 'ff0000'], 200)
+    >>> print(g.render('█' * 120))   # a progress bar, colored by position
+    >>> print(g.at(0.9)('95%'))       # a heatmap cell, colored by value
+
+    :param colors: two or more (R, G, B) tuples or hex strings, evenly spaced
+    :param layer: ``'fg'``, ``'bg'`` or ``'hl'``, like ``fg256``, ``bg256`` and ``hl256``
+    :param perceptual: convert with ``rgb_to_xterm_perceptual`` instead of ``rgb_to_xterm``
+    """
+    __slots__ = ('steps', 'xterms', 'styles', 'runs', '_prefixes', '_end')
+
+    def __init__(self, colors: Any, steps: int, layer: str = 'fg', perceptual: bool = False):
+        rgbs = [c if isinstance(c, tuple) else hex_to_rgb(c) for c in colors]
+        if len(rgbs) < 2:
+            raise ValueError('a gradient needs at least two colors')
+        if steps < 1:
+            raise ValueError('steps must be positive')
+        try:
+            codes = _LAYER_CODES[layer]
+        except KeyError:
+            raise ValueError('layer must be fg, bg or hl') from None
+        convert = rgb_to_xterm_perceptual if perceptual else rgb_to_xterm
+
+        xterms = []
+        spans = len(rgbs) - 1
+        for i in range(steps):
+            pos = i * spans / (steps - 1) if steps > 1 else 0
+            k = min(int(pos), spans - 1)
+            t = pos - k
+            (r0, g0, b0), (r1, g1, b1) = rgbs[k], rgbs[k + 1]
+            xterms.append(convert(round(r0 + (r1 - r0) * t), round(g0 + (g1 - g0) * t),
+                                  round(b0 + (b1 - b0) * t)))
+
+        runs: List[Tuple[Style, int]] = []
+        styles = []
+        last = None
+        for x in xterms:
+            if x == last:
+                style, count = runs[-1]
+                runs[-1] = (style, count + 1)
+            else:
+                style = Style(*codes(x))
+                runs.append((style, 1))
+                last = x
+            styles.append(style)
+
+        self.steps = steps
+        self.xterms: Tuple[int, ...] = tuple(xterms)
+        self.styles: Tuple[Style, ...] = tuple(styles)
+        self.runs: Tuple[Tuple[Style, int], ...] = tuple(runs)
+        self._prefixes = tuple(style.start for style, _ in runs)
+        self._end = runs[0][0].end
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def __getitem__(self, i: int) -> Style:
+        return self.styles[i]
+
+    def __iter__(self):
+        return iter(self.styles)
+
+    def at(self, value: float) -> Style:
+        """The style at ``value`` from 0 to 1, clamped"""
+        i = int(value * self.steps)
+        return self.styles[0 if i < 0 else i if i < self.steps else self.steps - 1]
+
+    def render(self, s: str) -> str:
+        """Colors each character of ``s`` with the step at its position,
+        characters past ``steps`` get the style of the last step.
+        """
+        if not use_color() or not s:
+            return s
+
+        # render
+        parts = []
+        pos = 0
+        n = len(s)
+        for prefix, (_, count) in zip(self._prefixes, self.runs):
+            parts.append(prefix)
+            parts.append(s[pos:pos + count])
+            pos += count
+            if pos >= n:
+                break
+        else:
+            # longer than the gradient, the rest stays in the last step
+            parts.append(s[pos:])
+        parts.append(self._end)
+        return ''.join(parts)
+
+    def __repr__(self) -> str:
+        return 'Gradient({} steps, {} colors)'.format(self.steps, len(self.runs))
+
+
+###############################################################################
+# Writer
+###############################################################################
+
+class ColorWriter:
+    """Writes styled segments to a text or binary stream.
+
+    Adjacent segments of the same style share one pair of escape sequences,
+    switching styles emits only the difference (see ``sgr_transition``), and
+    output is collected into chunks of ``buffer_size`` characters before being
+    written to the stream.
+
+    >>> with ColorWriter(sys.stdout) as w:
+    ...     w.write(red, 'error: ')
+    ...     w.write(red, 'not found')  # no escape sequences between
+    ...     w.write(None, '\\n')
+
+    :param stream: defaults to ``sys.stdout``
+    :param color: whether to render styles, defaults to the one of ``color_context()``
+        if in one, else the color capability of the stream, which is the cached
+        ``use_color()`` for ``sys.stdout``
+    :param binary: whether the stream takes bytes, detected if not given.
+        Output to a binary stream is built from precomputed bytes escape
+        sequences, bytes text is written as is and str text is encoded.
+    """
+
+    def __init__(self, stream: Any = None, buffer_size: int = 65536, color: Optional[bool] = None,
+                 binary: Optional[bool] = None, encoding: str = 'utf-8'):
+        if stream is None:
+            stream = sys.stdout
+        if color is None:
+            support = _context_support.get()
+            if support is not None:
+                # set by color_context(), for any stream
+                color = support.enabled
+            else:
+                color = use_color() if stream is sys.stdout else detect_color_level(stream) > COLOR_NONE
+        if binary is None:
+            binary = isinstance(stream, (io.RawIOBase, io.BufferedIOBase))
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.color = color
+        self.binary = binary
+        self.encoding = encoding
+        self._parts: List[Any] = []
+        self._size = 0
+        self._style: Optional[Style] = None
+        self._transition = sgr_transition_bytes if binary else sgr_transition
+
+    def write(self, style: Optional[Style], text: AnyStr):
+        """Writes ``text`` in ``style``, ``None`` for plain text"""
+        if not text:
+            return
+        parts = self._parts
+        if self.color and style is not self._style:
+            if style != self._style:
+                parts.append(self._transition(self._style, style))
+            self._style = style
+        if self.binary and isinstance(text, str):
+            parts.append(text.encode(self.encoding))
+        else:
+            parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self._write_buffer()
+
+    def write_segments(self, segments: Any):
+        """Writes an iterable of ``(style, text)`` pairs"""
+        write = self.write
+        for style, text in segments:
+            write(style, text)
+
+    def _write_buffer(self):
+        data = (b'' if self.binary else '').join(self._parts)
+        self._parts = []
+        self._size = 0
+        if data:
+            self.stream.write(data)
+
+    def flush(self):
+        """Closes the current style, then writes out the buffer and flushes the stream"""
+        if self._style is not None:
+            self._parts.append(self._style.bend if self.binary else self._style.end)
+            self._style = None
+        self._write_buffer()
+        flush = getattr(self.stream, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def __enter__(self) -> 'ColorWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+
+__all__ = [name for name, value in globals().items()
+           if not name.startswith('_') and not isinstance(value, type(sys))
+           and name not in ('annotations', 'TYPE_CHECKING', 'OrderedDict', 'ContextVar')]
+__all__ += [name for name in _LAZY if not name.startswith('_')]
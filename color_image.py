@@ -0,0 +1,146 @@
+"""
+color_image.py
+==============
+
+Renders raw RGB pixels to the terminal with ``color.py``, two pixels per cell.
+
+Each cell is an upper half block ``▀``, its foreground is the upper pixel and
+its background the lower one. Only the colors that change from the cell before
+are emitted, so flat areas cost one character per cell.
+
+>>> from color_image import render
+>>>
+>>> # data: bytes, bytearray or memoryview of width * height RGB (or RGBA) pixels,
+>>> # e.g. Image.open(path).convert('RGB').tobytes() with PIL, which is not required
+>>> print(render(data, 200, 100))
+
+``rasterize()`` yields the lines one by one, for streaming output.
+The color level defaults to ``color.color_support().level``: 24 bit on
+truecolor terminals, else the nearest 256 colors (see ``color.rgb_to_xterm``),
+or the 16 system colors.
+"""
+
+from itertools import compress
+from operator import add, eq
+from typing import Any, Iterator, Optional
+
+import color
+
+
+UPPER_HALF = '▀'
+
+# Resets both colors at the end of each line, so lines render on their own
+LINE_END = color.esc(39, 49)
+
+
+# Per channel value lookups of the color cube index, scaled to add up to the
+# xterm color, like ``color.rgb_to_xterm``
+_CUBE_R = bytes(i * 36 for i in color._CUBE_INDEX)
+_CUBE_G = bytes(i * 6 for i in color._CUBE_INDEX)
+_CUBE_B = bytes(i + 16 for i in color._CUBE_INDEX)
+
+
+def _xterm_colors(rs: bytes, gs: bytes, bs: bytes) -> bytes:
+    """Converts the channels of a row of pixels to xterm-256 colors at once,
+    the same as ``color.rgb_to_xterm`` on each pixel
+    """
+    xs = bytearray(map(add, map(add, rs.translate(_CUBE_R), gs.translate(_CUBE_G)), bs.translate(_CUBE_B)))
+    # grays, where all channels are equal
+    for i in compress(range(len(rs)), map(eq, rs, gs)):
+        if rs[i] == bs[i]:
+            xs[i] = color._GRAY_XTERM[rs[i]]
+    return bytes(xs)
+
+
+def _indexed_line(fgs: Any, bgs: Any, fg_params: Any, bg_params: Any) -> str:
+    """Renders a line of cells of indexed colors, by the SGR parameters of each color"""
+    parts = []
+    last_fg = last_bg = None
+    for fg, bg in zip(fgs, bgs):
+        if fg != last_fg:
+            if bg != last_bg:
+                parts.append(f'\x1b[{fg_params[fg]};{bg_params[bg]}m{UPPER_HALF}')
+                last_bg = bg
+            else:
+                parts.append(f'\x1b[{fg_params[fg]}m{UPPER_HALF}')
+            last_fg = fg
+        elif bg != last_bg:
+            parts.append(f'\x1b[{bg_params[bg]}m{UPPER_HALF}')
+            last_bg = bg
+        else:
+            parts.append(UPPER_HALF)
+    parts.append(LINE_END)
+    return ''.join(parts)
+
+
+def _true_line(fgs: Any, bgs: Any) -> str:
+    """Renders a line of cells of (R, G, B) colors"""
+    parts = []
+    last_fg = last_bg = None
+    for fg, bg in zip(fgs, bgs):
+        if fg != last_fg:
+            if bg != last_bg:
+                parts.append('\x1b[38;2;%d;%d;%d;48;2;%d;%d;%dm' % (fg + bg) + UPPER_HALF)
+                last_bg = bg
+            else:
+                parts.append('\x1b[38;2;%d;%d;%dm' % fg + UPPER_HALF)
+            last_fg = fg
+        elif bg != last_bg:
+            parts.append('\x1b[48;2;%d;%d;%dm' % bg + UPPER_HALF)
+            last_bg = bg
+        else:
+            parts.append(UPPER_HALF)
+    parts.append(LINE_END)
+    return ''.join(parts)
+
+
+def rasterize(data: Any, width: int, height: int, channels: int = 3, level: Optional[int] = None) -> Iterator[str]:
+    """Yields the lines of an image, each line is two rows of pixels.
+
+    On 16 color terminals, each pixel gets the system color nearest to its 256 color.
+
+    :param data: ``width * height`` pixels of ``channels`` bytes each, RGB or RGBA
+        (alpha is ignored), row by row
+    :param level: color level, one of ``color.COLOR_*``, defaults to ``color.color_support().level``
+    :raises ValueError: If the size of ``data`` does not match.
+    """
+    pixels = memoryview(data).cast('B')
+    row_size = width * channels
+    if len(pixels) != row_size * height:
+        raise ValueError('image data must be of {} bytes, got {}'.format(row_size * height, len(pixels)))
+    if level is None:
+        level = color.color_support().level
+    if level == color.COLOR_NONE:
+        for _ in range(0, height, 2):
+            yield UPPER_HALF * width
+        return
+
+    if level == color.COLOR_TRUE:
+        convert: Any = lambda rs, gs, bs: list(zip(rs, gs, bs))
+    elif level == color.COLOR_256:
+        convert = _xterm_colors
+        fg_params = tuple('38;5;%d' % x for x in range(256))
+        bg_params = tuple('48;5;%d' % x for x in range(256))
+    else:
+        ansi16 = bytes(color.rgb_to_ansi16(*rgb) for rgb in color.XTERM_PALETTE)
+        convert = lambda rs, gs, bs: _xterm_colors(rs, gs, bs).translate(ansi16)
+        fg_params = tuple(str(30 + i if i < 8 else 82 + i) for i in range(16))
+        bg_params = tuple(str(40 + i if i < 8 else 92 + i) for i in range(16))
+
+    def colors(y):
+        row = pixels[y * row_size:(y + 1) * row_size]
+        return convert(row[0::channels].tobytes(), row[1::channels].tobytes(), row[2::channels].tobytes())
+
+    for y in range(0, height, 2):
+        fgs = colors(y)
+        # an odd last row has no lower pixels, keep the default background
+        bgs = colors(y + 1) if y + 1 < height else [None] * width
+        if level == color.COLOR_TRUE:
+            yield _true_line(fgs, bgs)
+        else:
+            yield _indexed_line(fgs, bgs, fg_params, bg_params)
+
+
+def render(data: Any, width: int, height: int, channels: int = 3, level: Optional[int] = None) -> str:
+    """Renders an image at once, see ``rasterize()``"""
+    return '\n'.join(rasterize(data, width, height, channels, level))
@@ -0,0 +1,150 @@
+"""
+color_logging.py
+================
+
+A ``logging.Formatter`` that colors records by level with ``color.py``.
+
+>>> import logging
+>>> from color_logging import ColorFormatter
+>>>
+>>> handler = logging.StreamHandler()
+>>> handler.setFormatter(ColorFormatter('%(levelname)s %(name)s: %(message)s'))
+>>> logging.getLogger().addHandler(handler)
+
+The styled level name of each level is rendered once and cached, so formatting
+a record costs one dict lookup on top of ``logging.Formatter``. With ``line=True``
+the whole record is colored instead, by the precomputed prefix and suffix of its level.
+Widths of the level name field, like ``%(levelname)-8s``, pad the name inside the
+escape sequences, so columns line up as with ``logging.Formatter``.
+
+Whether to color follows the cached ``color.use_color()`` (and ``color.color_context()``),
+unless ``use_color`` is given, e.g. for a handler on ``sys.stderr``:
+
+>>> ColorFormatter(use_color=color.detect_color_level(sys.stderr) > color.COLOR_NONE)
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+import color
+
+
+# The default styles of the standard levels
+LEVEL_STYLES: Dict[int, Any] = {
+    logging.DEBUG: color.Style(2),
+    logging.INFO: color.green,
+    logging.WARNING: color.yellow,
+    logging.ERROR: color.red,
+    logging.CRITICAL: color.bold + color.red,
+}
+
+# The levelname field with a width or conversion, like %(levelname)-8s or {levelname:<8}
+_LEVELNAME_FIELDS = {
+    '%': re.compile(r'%\(levelname\)([#0 +-]*\d*(?:\.\d+)?[sra])'),
+    '{': re.compile(r'\{levelname((?:![rsa])?(?::[^{}]*)?)\}'),
+}
+
+
+class ColorFormatter(logging.Formatter):
+    """Formats records like ``logging.Formatter``, with the level name styled by level.
+
+    ``validate`` and ``defaults`` are passed to ``logging.Formatter``, so it can be
+    configured like one by ``logging.config.dictConfig()``.
+
+    :param level_styles: level number -> ``Style``, levels between the given ones
+        use the style of the nearest lower level, defaults to ``LEVEL_STYLES``
+    :param line: style the whole record instead of the level name
+    :param use_color: whether to color, follows ``color.use_color()`` if not given
+    """
+
+    def __init__(self, fmt: Optional[str] = None, datefmt: Optional[str] = None, style: str = '%',
+                 validate: bool = True, *, defaults: Optional[Mapping[str, Any]] = None,
+                 level_styles: Optional[Mapping[int, Any]] = None, line: bool = False,
+                 use_color: Optional[bool] = None):
+        # defaults is new in Python 3.10, only passed when given
+        extra = {} if defaults is None else {'defaults': defaults}
+        super().__init__(fmt, datefmt, style, validate, **extra)  # type: ignore
+        self.level_styles = dict(LEVEL_STYLES if level_styles is None else level_styles)
+        self.line = line
+        self.use_color = use_color
+        # (levelno, levelname) -> styled level name
+        self._levelnames: Dict[Tuple[int, str], str] = {}
+        # levelname -> level name padded to the width of its field
+        self._padded: Dict[str, str] = {}
+        # levelno -> (prefix, suffix)
+        self._affixes: Dict[int, Tuple[str, str]] = {}
+
+        # The escape sequences would count in the width of the levelname field,
+        # so the field is replaced by a plain one and the level name is padded
+        # by its spec before it is styled
+        self._pad: Optional[Callable[[str], str]] = None
+        field = _LEVELNAME_FIELDS.get(style)
+        m = field.search(self._style._fmt) if field is not None else None
+        if m is not None and m.group(1) not in ('s', ''):
+            if style == '%':
+                self._pad = ('%' + m.group(1)).__mod__
+                plain_field = '%(levelname)s'
+            else:
+                self._pad = ('{0' + m.group(1) + '}').format
+                plain_field = '{levelname}'
+            fmt = self._style._fmt
+            self._style._fmt = self._fmt = fmt[:m.start()] + plain_field + fmt[m.end():]
+
+    def level_style(self, levelno: int) -> Optional[color.Style]:
+        """The style of a level number"""
+        style = self.level_styles.get(levelno)
+        if style is None:
+            lower = [n for n in self.level_styles if n < levelno]
+            if lower:
+                style = self.level_styles[max(lower)]
+        return style
+
+    def _affix(self, levelno: int) -> Tuple[str, str]:
+        style = self.level_style(levelno)
+        affix = (style.start, style.end) if style is not None else ('', '')
+        self._affixes[levelno] = affix
+        return affix
+
+    def _format(self, record: logging.LogRecord, levelname: str) -> str:
+        """Formats with ``levelname`` set on the record only while formatting,
+        other handlers see the record as is
+        """
+        original = record.levelname
+        record.levelname = levelname
+        try:
+            return super().format(record)
+        finally:
+            record.levelname = original
+
+    def format(self, record: logging.LogRecord) -> str:
+        enabled = self.use_color
+        if enabled is None:
+            enabled = color.use_color()
+        pad = self._pad
+
+        if enabled and not self.line:
+            levelname = record.levelname
+            key = (record.levelno, levelname)
+            try:
+                styled = self._levelnames[key]
+            except KeyError:
+                prefix, suffix = self._affix(record.levelno)
+                styled = self._levelnames[key] = prefix + (pad(levelname) if pad else levelname) + suffix
+            return self._format(record, styled)
+
+        if pad is None:
+            formatted = super().format(record)
+        else:
+            try:
+                padded = self._padded[record.levelname]
+            except KeyError:
+                padded = self._padded[record.levelname] = pad(record.levelname)
+            formatted = self._format(record, padded)
+        if not enabled:
+            return formatted
+        try:
+            prefix, suffix = self._affixes[record.levelno]
+        except KeyError:
+            prefix, suffix = self._affix(record.levelno)
+        return prefix + formatted + suffix
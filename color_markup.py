@@ -0,0 +1,131 @@
+"""
+color_markup.py
+===============
+
+Tag markup for ``color.py`` templates, compiled once into a render plan.
+
+>>> from color_markup import markup
+>>>
+>>> print(markup('[bold red]{name}[/] [bg256=E0B4B4 fg256=912D2B]{msg}[/]', name='db', msg='down'))
+
+A tag is a list of style names, like ``[bold red]`` or ``[cyan_bg]``, or a 256
+color with its hex value, like ``[fg256=276F86]``, ``[bg256=E0B4B4]`` or
+``[hl256=10a3a3]``. ``[/]`` closes the last open tag, tags nest, and ``[[``
+is a literal ``[``. Fields are ``str.format`` fields, so ``{{`` is a literal ``{``,
+and brackets inside fields, like ``{d[key]}``, are not tags.
+
+A template is parsed once and cached, into a format string with the escape
+sequences between its chunks already in place, each the minimal transition
+from the style before (see ``color.sgr_transition``). Rendering is a single
+``str.format`` call. Field values are not parsed for tags.
+"""
+
+import re
+from typing import Any, List, Optional
+
+import color
+
+
+# A format field, kept as is: {{, }}, or {...} with at most one level of nested
+# fields like {x:>{width}}. Else [[, or a tag: [/] or [names], where names start with a letter
+_TAG = re.compile(r'(\{\{|\}\}|\{(?:[^{}]|\{[^{}]*\})*\})|\[\[|\[(/?)([A-Za-z][\w=#]*(?: +[\w=#]+)*)?\]')
+
+
+def parse_style(spec: str) -> color.Style:
+    """Parses the content of a tag, like ``'bold red'`` or ``'bg256=E0B4B4'``, to a ``Style``
+
+    :raises ValueError: If a name is not a style of ``color.py``.
+    """
+    style = color.Style()
+    for word in spec.split():
+        name, _, value = word.partition('=')
+        if value:
+            # fg256, bg256 and hl256
+            codes = color._LAYER_CODES.get(name[:-3]) if name.endswith('256') else None
+            if codes is None:
+                raise ValueError('unknown color: {}'.format(name))
+            style += color.Style(*codes(color.rgb_to_xterm(*color.hex_to_rgb(value))))
+            continue
+        named = getattr(color, name, None)
+        if not isinstance(named, color.Style):
+            raise ValueError('unknown style: {}'.format(name))
+        style += named
+    return style
+
+
+class Markup:
+    """A compiled markup template, see ``compile_markup()``
+
+    ``styled`` and ``plain`` are the format strings with and without escape sequences.
+    """
+    __slots__ = ('template', 'styled', 'plain')
+
+    def __init__(self, template: str):
+        self.template = template
+        styled: List[str] = []
+        plain: List[str] = []
+        stack: List[color.Style] = []
+        # the style in effect, and the style the output is in
+        current: Optional[color.Style] = None
+        emitted: Optional[color.Style] = None
+
+        def add(text):
+            nonlocal emitted
+            if not text:
+                return
+            if current != emitted:
+                styled.append(color.sgr_transition(emitted, current))
+                emitted = current
+            styled.append(text)
+            plain.append(text)
+
+        pos = 0
+        for m in _TAG.finditer(template):
+            add(template[pos:m.start()])
+            pos = m.end()
+            field, closing, spec = m.groups()
+            if field:
+                add(field)
+                continue
+            if m.group() == '[[':
+                add('[')
+                continue
+            if closing:
+                if spec is not None:
+                    raise ValueError('closing tags take no names, use [/]: {}'.format(m.group()))
+                if not stack:
+                    raise ValueError('[/] at {} closes no tag'.format(m.start()))
+                stack.pop()
+            elif spec is None:
+                raise ValueError('empty tag at {}'.format(m.start()))
+            else:
+                stack.append(parse_style(spec) if current is None else current + parse_style(spec))
+            current = stack[-1] if stack else None
+        add(template[pos:])
+        if emitted is not None:
+            styled.append(color.sgr_transition(emitted, None))
+
+        self.styled = ''.join(styled)
+        self.plain = ''.join(plain)
+
+    def format(self, *args: Any, **kwargs: Any) -> str:
+        """Renders the template with fields, with escape sequences if ``color.use_color()``"""
+        return (self.styled if color.use_color() else self.plain).format(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return 'Markup({!r})'.format(self.template)
+
+
+@color.memorize(maxsize=color.CACHE_MAXSIZE)
+def compile_markup(template: str) -> Markup:
+    """Compiles a markup template, the result is cached by template
+
+    :raises ValueError: If a tag is invalid, or a ``[/]`` closes no tag.
+        Tags still open at the end are closed there.
+    """
+    return Markup(template)
+
+
+def markup(template: str, *args: Any, **kwargs: Any) -> str:
+    """Renders a markup template with fields, compiling it on first use"""
+    return compile_markup(template).format(*args, **kwargs)
@@ -0,0 +1,134 @@
+"""
+color_screen.py
+===============
+
+A screen buffer for live updating terminal output with ``color.py``.
+
+Cells are kept as a character and a style id (of ``color.style_registry``)
+in two compact arrays. Each ``render()`` diffs the frame against the one
+rendered before, and emits only cursor moves and the runs of changed cells,
+switching styles with the minimal SGR difference (see ``color.sgr_transition``).
+Only the columns written since the last frame are compared, so the cost of a
+frame grows with the changed cells, not with the size of the screen.
+
+>>> import color
+>>> from color_screen import Screen
+>>>
+>>> screen = Screen(80, 24)
+>>> screen.put(0, 0, 'status: ')
+>>> screen.put(8, 0, 'ok', color.green)
+>>> sys.stdout.write(screen.render())   # draws everything
+>>> screen.put(8, 0, 'failed', color.bold + color.red)
+>>> sys.stdout.write(screen.render())   # draws only 'failed'
+
+Each character takes one column, wide characters are not supported.
+"""
+
+from array import array
+from typing import Dict, List, Union
+
+import color
+
+
+# Changed cells closer than this are drawn in one run, rewriting the unchanged cells
+# between them, as that is shorter than the cursor move to skip them.
+RUN_GAP = 6
+
+
+class Screen:
+    """A ``width`` x ``height`` screen of styled cells, see the module docs"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        size = width * height
+        # the frame being drawn, as character code points and style ids
+        self.chars = array('I', [ord(' ')]) * size
+        self.styles = array('I', [0]) * size
+        # the frame on the terminal, code point 0 marks cells that are unknown
+        self._front_chars = array('I', [0]) * size
+        self._front_styles = array('I', [0]) * size
+        # row -> [first, end) columns written since the last render
+        self._dirty: Dict[int, List[int]] = {y: [0, width] for y in range(height)}
+
+    def put(self, x: int, y: int, text: str, style: Union[color.Style, int, None] = None):
+        """Writes ``text`` at column ``x`` of row ``y`` in ``style``, cut at the right edge
+
+        :param style: a ``Style``, or its id in ``color.style_registry``
+        """
+        if not 0 <= y < self.height or not 0 <= x < self.width:
+            return
+        text = text[:self.width - x]
+        start = y * self.width + x
+        end = start + len(text)
+        self.chars[start:end] = array('I', map(ord, text))
+        sid = style if isinstance(style, int) else color.style_registry.intern(style)
+        self.styles[start:end] = array('I', [sid]) * len(text)
+        dirty = self._dirty.get(y)
+        if dirty is None:
+            self._dirty[y] = [x, x + len(text)]
+        else:
+            if x < dirty[0]:
+                dirty[0] = x
+            if x + len(text) > dirty[1]:
+                dirty[1] = x + len(text)
+
+    def clear(self):
+        """Clears the frame being drawn, cleared cells are drawn as spaces"""
+        size = self.width * self.height
+        self.chars = array('I', [ord(' ')]) * size
+        self.styles = array('I', [0]) * size
+        self._dirty = {y: [0, self.width] for y in range(self.height)}
+
+    def invalidate(self):
+        """Makes the next ``render()`` draw every cell, e.g. after the terminal was cleared"""
+        size = self.width * self.height
+        self._front_chars = array('I', [0]) * size
+        self._front_styles = array('I', [0]) * size
+        self._dirty = {y: [0, self.width] for y in range(self.height)}
+
+    def _runs(self, start: int, end: int) -> List[List[int]]:
+        """The runs of changed cells from ``start`` to ``end`` as [first, last] indexes"""
+        chars, styles = self.chars, self.styles
+        fchars, fstyles = self._front_chars, self._front_styles
+        runs: List[List[int]] = []
+        for i in range(start, end):
+            if chars[i] != fchars[i] or styles[i] != fstyles[i]:
+                if runs and i - runs[-1][1] <= RUN_GAP:
+                    runs[-1][1] = i
+                else:
+                    runs.append([i, i])
+        return runs
+
+    def render(self) -> str:
+        """Returns the output that updates the terminal from the last rendered frame to this one"""
+        width = self.width
+        chars, styles = self.chars, self.styles
+        fchars, fstyles = self._front_chars, self._front_styles
+        transition = color.style_registry.transition
+        use_color = color.use_color()
+        parts = []
+        current = 0
+        for y, (x0, x1) in sorted(self._dirty.items()):
+            row = y * width
+            start = row + x0
+            end = row + x1
+            if chars[start:end] == fchars[start:end] and styles[start:end] == fstyles[start:end]:
+                continue
+            for first, last in self._runs(start, end):
+                parts.append(f'\x1b[{y + 1};{first - row + 1}H')
+                if not use_color:
+                    parts.append(''.join(map(chr, chars[first:last + 1])))
+                else:
+                    for i in range(first, last + 1):
+                        sid = styles[i]
+                        if sid != current:
+                            parts.append(transition(current, sid))
+                            current = sid
+                        parts.append(chr(chars[i]))
+                fchars[first:last + 1] = chars[first:last + 1]
+                fstyles[first:last + 1] = styles[first:last + 1]
+        if current:
+            parts.append(transition(current, 0))
+        self._dirty = {}
+        return ''.join(parts)
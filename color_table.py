@@ -0,0 +1,159 @@
+"""
+color_table.py
+==============
+
+Colored table layout on top of ``color.py``.
+
+Cells keep their text and style apart, so column widths are computed from the
+raw text once, as rows are added, and styles are only applied when rendering.
+
+>>> import color
+>>> from color_table import Table
+>>>
+>>> t = Table(['name', 'status'], align='lr')
+>>> t.add_row('api', ('ok', color.green))
+>>> t.add_row('worker', ('failed', color.bold + color.red))
+>>> print(t.render())
+
+For rows that do not fit in memory, ``Table.stream(rows, sample=100)`` takes
+column widths from the first ``sample`` rows, then renders the rest as they come.
+"""
+
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import color
+
+
+# text, style, width
+_Cell = Tuple[str, Any, int]
+
+ELLIPSIS = color.ELLIPSIS
+
+
+def _cell(value: Any, style: Any = None) -> _Cell:
+    if isinstance(value, tuple):
+        value, style = value
+    text = value if isinstance(value, str) else str(value)
+    return text, style, color.text_width(text)
+
+
+def truncate(text: str, width: int, ellipsis: str = ELLIPSIS) -> str:
+    """Cuts ``text`` (without escape sequences) to at most ``width`` columns, ending with ``ellipsis``"""
+    if color.text_width(text) <= width:
+        return text
+    ellipsis_width = color.text_width(ellipsis)
+    if width <= ellipsis_width:
+        return ellipsis if width == ellipsis_width else ''
+    return text[:color.text_cut(text, width - ellipsis_width)] + ellipsis
+
+
+class Table:
+    """A table of styled cells.
+
+    :param headers: column headers, optional
+    :param align: alignment of each column, ``l``, ``r`` or ``c``, as a string like ``'lrr'``
+        or a list, missing columns are left aligned
+    :param sep: the string between columns
+    :param header_style: the style of headers
+    """
+
+    def __init__(self, headers: Optional[Sequence[Any]] = None, align: Union[str, Sequence[str]] = '',
+                 sep: str = '  ', header_style: Any = color.bold):
+        self.align = list(align)
+        self.sep = sep
+        self.header: Optional[List[_Cell]] = None
+        self.rows: List[List[_Cell]] = []
+        self.widths: List[int] = []
+        if headers is not None:
+            self.header = [_cell(h, header_style) for h in headers]
+            self._update_widths(self.header)
+
+    def _update_widths(self, cells: List[_Cell]):
+        widths = self.widths
+        for i, (_, _, w) in enumerate(cells):
+            if i == len(widths):
+                widths.append(w)
+            elif w > widths[i]:
+                widths[i] = w
+
+    def add_row(self, *cells: Any):
+        """Adds a row, each cell is a value or a ``(value, style)`` pair,
+        ``style`` is a ``Style`` or any function that colors a string.
+        """
+        row = [_cell(c) for c in cells]
+        self._update_widths(row)
+        self.rows.append(row)
+
+    def add_rows(self, rows: Iterable[Sequence[Any]]):
+        for row in rows:
+            self.add_row(*row)
+
+    def _render_row(self, row: List[_Cell], widths: List[int], use_color: bool, cut: bool) -> str:
+        parts = []
+        last = len(row) - 1
+        for i, (text, style, w) in enumerate(row):
+            width = widths[i] if i < len(widths) else w
+            if cut and w > width:
+                text = truncate(text, width)
+                w = color.text_width(text)
+            if use_color and style is not None and text:
+                if isinstance(style, color.Style):
+                    styled = f'{style.start}{text}{style.end}'
+                else:
+                    styled = style(text)
+            else:
+                styled = text
+            pad = width - w
+            if pad <= 0:
+                parts.append(styled)
+                continue
+            align = self.align[i] if i < len(self.align) else 'l'
+            if align == 'r':
+                parts.append(' ' * pad + styled)
+            elif align == 'c':
+                left = pad // 2
+                parts.append(' ' * left + styled + ' ' * (pad - left))
+            elif i == last:
+                parts.append(styled)
+            else:
+                parts.append(styled + ' ' * pad)
+        return self.sep.join(parts)
+
+    def lines(self) -> Iterator[str]:
+        """Renders the table line by line"""
+        use_color = color.use_color()
+        widths = self.widths
+        if self.header is not None:
+            yield self._render_row(self.header, widths, use_color, False)
+        for row in self.rows:
+            yield self._render_row(row, widths, use_color, False)
+
+    def render(self) -> str:
+        return '\n'.join(self.lines())
+
+    def stream(self, rows: Iterable[Sequence[Any]], sample: int = 100, cut: bool = True) -> Iterator[str]:
+        """Renders ``rows`` line by line without keeping them.
+
+        Column widths are taken from the rows already added and the first ``sample`` rows,
+        later cells that are wider are cut with an ellipsis, or overflow if ``cut`` is false.
+        """
+        rows = iter(rows)
+        for row in rows:
+            self.add_row(*row)
+            if len(self.rows) >= sample:
+                break
+        yield from self.lines()
+        self.rows = []
+
+        use_color = color.use_color()
+        widths = self.widths
+        render_row = self._render_row
+        for row in rows:
+            yield render_row([_cell(c) for c in row], widths, use_color, cut)
+
+
+def table(rows: Iterable[Sequence[Any]], headers: Optional[Sequence[Any]] = None, **kwargs: Any) -> str:
+    """Renders ``rows`` as a table in one call, keyword arguments are passed to ``Table``"""
+    t = Table(headers, **kwargs)
+    t.add_rows(rows)
+    return t.render()
@@ -0,0 +1,358 @@
+"""
+color_text.py
+=============
+
+Styled text that stays editable, on top of ``color.py``.
+
+A ``Text`` keeps the plain text and its spans of styles apart, each span is
+``(start, end, style id)`` of ``color.style_registry``, stored flat in an
+``array``. Slicing, concatenation, truncation and wrapping work on the plain
+text and shift or clip the spans, escape sequences are only produced by
+``render()`` or ``render_bytes()``.
+
+>>> import color
+>>> from color_text import Text
+>>>
+>>> t = Text.assemble(('error', color.bold + color.red), ': disk ', ('/dev/sda1', color.cyan), ' is full')
+>>> print(t.truncate(20).render())
+>>> for line in t.wrap(12):
+...     print(line.render())
+
+``parse_ansi()`` (or ``Text.from_ansi()``) turns strings already colored, by
+``color.py`` or by other programs, back into a ``Text``.
+"""
+
+from array import array
+import re
+from typing import Any, Iterator, List, Optional, Tuple, Union
+
+import color
+
+
+ELLIPSIS = color.ELLIPSIS
+
+_WORD = re.compile(r'\S+')
+
+_ESCAPE = re.compile(color._ANSI_PATTERN)
+
+
+class Text:
+    """Plain text with style spans, see the module docs.
+
+    :param plain: the text without escape sequences
+    :param spans: flat ``start, end, style id`` triples, sorted and not overlapping
+    """
+    __slots__ = ('plain', 'spans')
+
+    def __init__(self, plain: str = '', spans: Any = ()):
+        self.plain = plain
+        self.spans = spans if isinstance(spans, array) else array('I', spans)
+
+    @classmethod
+    def styled(cls, plain: str, style: Union[color.Style, int, None]) -> 'Text':
+        """A text all in one style, a ``Style`` or its id"""
+        sid = style if isinstance(style, int) else color.style_registry.intern(style)
+        if not sid or not plain:
+            return cls(plain)
+        return cls(plain, (0, len(plain), sid))
+
+    @classmethod
+    def assemble(cls, *parts: Any) -> 'Text':
+        """Joins parts, each is a ``str``, a ``(str, style)`` pair or a ``Text``"""
+        plains: List[str] = []
+        spans = array('I')
+        pos = 0
+        intern = color.style_registry.intern
+        for part in parts:
+            if isinstance(part, Text):
+                plain = part.plain
+                _extend(spans, part.spans, pos)
+            elif isinstance(part, tuple):
+                plain, style = part
+                sid = style if isinstance(style, int) else intern(style)
+                if sid and plain:
+                    _extend(spans, (0, len(plain), sid), pos)
+            else:
+                plain = part
+            plains.append(plain)
+            pos += len(plain)
+        return cls(''.join(plains), spans)
+
+    def span_tuples(self) -> Iterator[Tuple[int, int, int]]:
+        """The spans as ``(start, end, style id)`` tuples"""
+        spans = self.spans
+        return zip(spans[0::3], spans[1::3], spans[2::3])
+
+    def __len__(self) -> int:
+        return len(self.plain)
+
+    @property
+    def width(self) -> int:
+        """The number of terminal columns"""
+        return color.text_width(self.plain)
+
+    def __add__(self, other: Union['Text', str]) -> 'Text':
+        if isinstance(other, str):
+            return Text(self.plain + other, self.spans)
+        if not isinstance(other, Text):
+            return NotImplemented
+        spans = array('I', self.spans)
+        _extend(spans, other.spans, len(self.plain))
+        return Text(self.plain + other.plain, spans)
+
+    def __radd__(self, other: str) -> 'Text':
+        if not isinstance(other, str):
+            return NotImplemented
+        spans = array('I')
+        _extend(spans, self.spans, len(other))
+        return Text(other + self.plain, spans)
+
+    def __getitem__(self, key: Union[int, slice]) -> 'Text':
+        if isinstance(key, int):
+            if key < 0:
+                key += len(self.plain)
+            if not 0 <= key < len(self.plain):
+                raise IndexError('Text index out of range')
+            key = slice(key, key + 1)
+        start, stop, step = key.indices(len(self.plain))
+        if step != 1:
+            raise ValueError('Text slices do not support steps')
+        spans = array('I')
+        for s, e, sid in self.span_tuples():
+            if e <= start:
+                continue
+            if s >= stop:
+                break
+            spans.extend((max(s, start) - start, min(e, stop) - start, sid))
+        return Text(self.plain[start:stop], spans)
+
+    def style_at(self, index: int) -> int:
+        """The style id at ``index``, 0 for no style"""
+        for s, e, sid in self.span_tuples():
+            if s <= index < e:
+                return sid
+            if s > index:
+                break
+        return 0
+
+    def truncate(self, width: int, ellipsis: str = ELLIPSIS) -> 'Text':
+        """Cuts the text to at most ``width`` columns, ending with ``ellipsis``
+        in the style of the last character kept
+        """
+        plain = self.plain
+        if color.text_width(plain) <= width:
+            return self
+        ellipsis_width = color.text_width(ellipsis)
+        if width < ellipsis_width:
+            return Text()
+        index = color.text_cut(plain, width - ellipsis_width)
+        if not index:
+            return Text(ellipsis)
+        return self[:index] + Text.styled(ellipsis, self.style_at(index - 1))
+
+    def wrap(self, width: int) -> List['Text']:
+        """Wraps the text into lines of at most ``width`` columns, breaking at spaces,
+        and inside words longer than a line. Lines keep the styles of their spans.
+        """
+        lines: List[Text] = []
+        pos = 0
+        for paragraph in self.plain.split('\n'):
+            # the words of the current line, -1 before the first word
+            line_start = line_end = -1
+            line_width = 0
+            for m in _WORD.finditer(paragraph):
+                start, end = m.span()
+                word_width = color.text_width(m.group())
+                if line_end >= 0:
+                    gap = color.text_width(paragraph[line_end:start])
+                    if line_width + gap + word_width <= width:
+                        line_end = end
+                        line_width += gap + word_width
+                        continue
+                    lines.append(self[pos + line_start:pos + line_end])
+                # words longer than a line are broken into pieces
+                while word_width > width:
+                    cut = color.text_cut(paragraph[start:end], width) or 1
+                    lines.append(self[pos + start:pos + start + cut])
+                    start += cut
+                    word_width = color.text_width(paragraph[start:end])
+                line_start, line_end, line_width = start, end, word_width
+            lines.append(self[pos + line_start:pos + line_end] if line_start >= 0 else Text())
+            pos += len(paragraph) + 1
+        return lines
+
+    @classmethod
+    def from_ansi(cls, s: str) -> 'Text':
+        """Parses a string with escape sequences, see ``parse_ansi()``"""
+        return parse_ansi(s)
+
+    def segments(self) -> Iterator[Tuple[Optional[color.Style], str]]:
+        """Yields ``(style, text)`` pairs, e.g. for ``ColorWriter.write_segments``"""
+        styles = color.style_registry.styles
+        plain = self.plain
+        pos = 0
+        for s, e, sid in self.span_tuples():
+            if s > pos:
+                yield None, plain[pos:s]
+            yield styles[sid], plain[s:e]
+            pos = e
+        if pos < len(plain):
+            yield None, plain[pos:]
+
+    def _render(self, transition: Any, encode: Any) -> Any:
+        parts = []
+        plain = self.plain
+        pos = current = 0
+        for s, e, sid in self.span_tuples():
+            if s > pos:
+                if current:
+                    parts.append(transition(current, 0))
+                    current = 0
+                parts.append(encode(plain[pos:s]))
+            parts.append(transition(current, sid))
+            parts.append(encode(plain[s:e]))
+            current = sid
+            pos = e
+        if current:
+            parts.append(transition(current, 0))
+        if pos < len(plain):
+            parts.append(encode(plain[pos:]))
+        return parts
+
+    def render(self) -> str:
+        """Renders to a string with escape sequences, or the plain text if ``color.use_color()`` is false"""
+        if not self.spans or not color.use_color():
+            return self.plain
+        return ''.join(self._render(color.style_registry.transition, str))
+
+    def render_bytes(self, encoding: str = 'utf-8') -> bytes:
+        """Same as ``render``, in bytes"""
+        if not self.spans or not color.use_color():
+            return self.plain.encode(encoding)
+        return b''.join(self._render(color.style_registry.btransition, lambda s: s.encode(encoding)))
+
+    def __str__(self) -> str:
+        return self.render()
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Text):
+            return NotImplemented
+        return self.plain == other.plain and self.spans == other.spans
+
+    def __repr__(self) -> str:
+        return 'Text({!r}, {})'.format(self.plain, list(self.span_tuples()))
+
+
+def _extend(spans: Any, other: Any, offset: int):
+    """Appends the spans ``other`` shifted by ``offset`` to ``spans``,
+    merging spans of the same style that touch
+    """
+    if not other:
+        return
+    if spans and spans[-2] == offset + other[0] and spans[-1] == other[2]:
+        spans[-2] = offset + other[1]
+        other = other[3:]
+    if offset:
+        other = [v + offset if i % 3 != 2 else v for i, v in enumerate(other)]
+    spans.extend(other)
+
+
+def _sgr_codes(params: str) -> Tuple[int, ...]:
+    """The SGR codes of ``params``, with ITU sub-parameters like ``38:2::255:0:0`` converted to
+    the form ``color.sgr_apply`` takes, ``38;2;255;0;0``
+
+    :raises ValueError: If a parameter is not a number.
+    """
+    if ':' not in params:
+        return tuple(int(c) if c else 0 for c in params.split(';'))
+    codes: List[int] = []
+    for param in params.split(';'):
+        if ':' not in param:
+            codes.append(int(param) if param else 0)
+            continue
+        sub = [int(c) if c else 0 for c in param.split(':')]
+        if sub[0] in (38, 48) and len(sub) > 2 and sub[1] == 5:
+            codes.extend(sub[:3])
+        elif sub[0] in (38, 48) and len(sub) > 4 and sub[1] == 2:
+            # 38:2:colorspace:r:g:b, the colorspace id is often empty, or 38:2:r:g:b
+            codes.extend(sub[:2] + sub[-3:] if len(sub) > 5 else sub[:5])
+        elif sub[0] == 4 and sub[1:2] == [0]:
+            # 4:0 is no underline, 4:n other underline styles
+            codes.append(24)
+        else:
+            codes.append(sub[0])
+    return tuple(codes)
+
+
+@color.memorize(maxsize=color.CACHE_MAXSIZE)
+def _next_style(sid: int, params: str) -> int:
+    """The style id after SGR ``params`` (like ``'1;38;5;208'``) are applied to style id ``sid``"""
+    try:
+        codes = _sgr_codes(params)
+    except ValueError:
+        # private or malformed parameters, ignored
+        return sid
+    style = color.style_registry.styles[sid]
+    state = color.sgr_apply(style.slots if style is not None else {}, codes)
+    kept: List[int] = []
+    for param in state.values():
+        try:
+            color.Style(*param)
+        except ValueError:
+            # attributes color.py has no reset code for, like overline, are dropped
+            continue
+        kept.extend(param)
+    return color.style_registry.intern(color.Style(*kept)) if kept else 0
+
+
+def parse_ansi(s: str) -> Text:
+    """Parses a string with escape sequences into a ``Text``, in a single pass.
+
+    SGR sequences are applied like a terminal would, including ``38;5;n``,
+    ``48;5;n``, ``38;2;r;g;b``, their ITU forms like ``38:2::r:g:b``, and resets
+    of several attributes like ``22;27;39``. Other escape sequences, like cursor
+    moves and hyperlinks, are dropped.
+
+    Each distinct style is interned into ``color.style_registry``, which keeps
+    it for the life of the process, so parsing truecolor output of many colors,
+    like images, grows the registry by an id per color. ``color.strip_ansi()``
+    is the way to go for input that only needs the text.
+    """
+    if '\x1b' not in s:
+        return Text(s)
+    plains = []
+    spans = array('I')
+    next_style = _next_style
+    # position in the plain text, and where the current style started
+    pos = span_start = 0
+    sid = 0
+    last = 0
+    for m in _ESCAPE.finditer(s):
+        start = m.start()
+        if start > last:
+            chunk = s[last:start]
+            plains.append(chunk)
+            pos += len(chunk)
+        last = m.end()
+        seq = m.group()
+        if seq[1] != '[' or seq[-1] != 'm':
+            continue
+        new = next_style(sid, seq[2:-1])
+        if new == sid:
+            continue
+        if sid and pos > span_start:
+            if spans and spans[-2] == span_start and spans[-1] == sid:
+                spans[-2] = pos
+            else:
+                spans.extend((span_start, pos, sid))
+        sid = new
+        span_start = pos
+    if last < len(s):
+        plains.append(s[last:])
+        pos += len(s) - last
+    if sid and pos > span_start:
+        if spans and spans[-2] == span_start and spans[-1] == sid:
+            spans[-2] = pos
+        else:
+            spans.extend((span_start, pos, sid))
+    return Text(''.join(plains), spans)
@@ -1,6 +1,8 @@
 import os
 import sys
 
+import pytest
+
 
 if os.getenv('COLOR_COMPAT'):
     print('use color_compat.py')
@@ -8,3 +10,19 @@ if os.getenv('COLOR_COMPAT'):
     sys.modules['color'] = sys.modules['color_compat']
 else:
     print('use color.py')
+
+
+@pytest.fixture
+def colored(monkeypatch):
+    """Make color detection deterministic: color enabled at 256 colors"""
+    import color
+    for k in ('NO_COLOR', 'FORCE_COLOR', 'COLORTERM'):
+        monkeypatch.delenv(k, raising=False)
+    monkeypatch.setenv('TERM', 'xterm-256color')
+    no_tty = color._use_color_no_tty
+    color.use_color_no_tty(True)
+    yield color
+    # tests may turn it off, restore it for the tests after
+    color.use_color_no_tty(no_tty)
+    if hasattr(color, 'reset_color_support'):
+        color.reset_color_support()
@@ -0,0 +1,52 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+np = pytest.importorskip('numpy')
+
+import color  # NOQA
+from rgbxterm_test import CLUT  # NOQA
+
+
+def test_rgb_to_xterm_array():
+    rand = np.random.RandomState(0)
+    rgb = rand.randint(0, 256, (5000, 3)).astype(np.uint8)
+    rgb[:256] = np.arange(256)[:, None]  # grays
+    xterm = color.rgb_to_xterm_array(rgb)
+    assert xterm.dtype == np.uint8
+    assert xterm.shape == (5000,)
+    expected = [color.rgb_to_xterm(*(int(v) for v in c)) for c in rgb]
+    assert xterm.tolist() == expected
+
+
+def test_rgb_to_xterm_array_shapes():
+    image = np.zeros((4, 5, 3), dtype=np.int64)
+    image[..., 0] = 255
+    xterm = color.rgb_to_xterm_array(image)
+    assert xterm.shape == (4, 5)
+    assert (xterm == color.rgb_to_xterm(255, 0, 0)).all()
+    assert color.rgb_to_xterm_array([[0x91, 0x2d, 0x2b]]).tolist() == [88]
+    assert color.rgb_to_xterm_array(np.zeros((0, 3))).shape == (0,)
+
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm_array(np.zeros((3, 4)))
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm_array([[256, 0, 0]])
+
+
+def test_hex_arrays():
+    hexes = [hex for _, hex in CLUT] + ['fff', b'912D2B', '#912D2B80']
+    rgb = color.hex_to_rgb_array(hexes)
+    assert rgb.tolist() == [list(color.hex_to_rgb(color.t_(h))) for h in hexes]
+    assert color.hex_to_xterm_array(hexes).tolist() == [color.rgb_to_xterm(*c) for c in rgb.tolist()]
+
+
+@pytest.mark.parametrize('hexes', [['ff'], ['gggggg'], ['ff00ff', '12345'], ['ffé'], ['ff00ffZZ']])
+def test_invalid_hex_arrays(hexes):
+    with pytest.raises(ValueError):
+        color.hex_to_rgb_array(hexes)
@@ -0,0 +1,430 @@
+# coding: utf-8
+"""
+Benchmarks of color.py
+
+Run ``python test/benchmark.py`` to print the time per operation of each benchmark.
+
+- ``--save FILE``: save the results as a baseline (JSON of name -> ns per op).
+- ``--compare FILE``: compare with a saved baseline, exit with 1 if any benchmark
+  is slower than the baseline by more than ``--threshold`` (default 1.25, i.e. 25%).
+- ``--quick``: run each benchmark only briefly, for checking that the suite works.
+- names or prefixes as positional arguments select benchmarks, e.g. ``hex_to_rgb``.
+
+Baselines are only comparable on the same machine and Python version.
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import color  # NOQA
+import color_compat  # NOQA
+from color_image import render as render_image  # NOQA
+from color_logging import ColorFormatter  # NOQA
+from color_markup import markup  # NOQA
+from color_screen import Screen  # NOQA
+from color_table import Table  # NOQA
+from color_text import parse_ansi  # NOQA
+
+
+# name -> function returning (callable, operations per call)
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(func):
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+
+def _colors(n, seed=0):
+    rand = random.Random(seed)
+    return [(rand.randrange(256), rand.randrange(256), rand.randrange(256)) for _ in range(n)]
+
+
+def _hexes(n, seed=0):
+    return ['{:02x}{:02x}{:02x}'.format(*c) for c in _colors(n, seed)]
+
+
+for _module in (color, color_compat):
+    def _named(module=_module):
+        red, bold = module.red, module.bold
+        return (lambda: (red('error'), bold('title'))), 2
+
+    def _nested(module=_module):
+        bold, yellow, red_bg = module.bold, module.yellow, module.red_bg
+        return (lambda: bold(yellow(red_bg('warning')))), 1
+
+    def _fg256_hex(module=_module):
+        fg256, bg256, hl256 = module.fg256, module.bg256, module.hl256
+        return (lambda: (fg256('912D2B', 'x'), bg256('E0B4B4', 'x'), hl256('10a3a3', 'x'))), 3
+
+    def _fg256_tuple(module=_module):
+        fg256, bg256, hl256 = module.fg256, module.bg256, module.hl256
+        rgb = (0x91, 0x2d, 0x2b)
+        return (lambda: (fg256(rgb, 'x'), bg256(rgb, 'x'), hl256(rgb, 'x'))), 3
+
+    _prefix = '' if _module is color else 'compat.'
+    benchmark(_prefix + 'named_colors')(_named)
+    benchmark(_prefix + 'nested_composition')(_nested)
+    benchmark(_prefix + '256_hex')(_fg256_hex)
+    benchmark(_prefix + '256_tuple')(_fg256_tuple)
+
+
+@benchmark('composed_style')
+def _composed_style():
+    style = color.bold + color.yellow + color.red_bg
+    return (lambda: style('warning')), 1
+
+
+@benchmark('gradient_bar')
+def _gradient_bar():
+    gradient = color.Gradient(['00ff00', 'ffff00', 'ff0000'], 200)
+    bar = '#' * 200
+    return (lambda: gradient.render(bar)), 200
+
+
+@benchmark('fg256_bar')
+def _fg256_bar():
+    # the per cell fg256 calls a gradient saves
+    fg256 = color.fg256
+    hexes = ['{:02x}{:02x}00'.format(min(255, i * 255 // 100), min(255, (200 - i) * 255 // 100)) for i in range(200)]
+    return (lambda: ''.join([fg256(hx, '#') for hx in hexes])), 200
+
+
+@benchmark('markup')
+def _markup():
+    template = '[bold red]{name}[/] [bg256=E0B4B4]{msg}[/]'
+    return (lambda: markup(template, name='db', msg='down')), 1
+
+
+@benchmark('markup_nested_calls')
+def _markup_nested_calls():
+    # the same output as the markup benchmark, with color functions
+    bold, red, bg256 = color.bold, color.red, color.bg256
+    return (lambda: '{} {}'.format(bold(red('db')), bg256('E0B4B4', 'down'))), 1
+
+
+def _format_records(formatter):
+    levels = [logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR]
+    records = [logging.LogRecord('app', levels[i % 4], __file__, 1, 'request %d done', (i,), None)
+               for i in range(100)]
+    fmt = formatter.format
+
+    def run():
+        for record in records:
+            fmt(record)
+    return run, len(records)
+
+
+# records per second is 1e9 / ns per op
+benchmark('logging.plain')(lambda: _format_records(logging.Formatter('%(levelname)s %(name)s: %(message)s')))
+benchmark('logging.color')(lambda: _format_records(ColorFormatter('%(levelname)s %(name)s: %(message)s')))
+benchmark('logging.color_line')(
+    lambda: _format_records(ColorFormatter('%(levelname)s %(name)s: %(message)s', line=True)))
+
+
+def _image(level):
+    # a 200x100 photo like image: smooth gradients with some noise
+    rand = random.Random(0)
+    data = bytes(min(255, v + rand.randrange(8)) for y in range(100) for x in range(200)
+                 for v in (x * 255 // 200, y * 255 // 100, (x + y) * 255 // 300))
+    return (lambda: render_image(data, 200, 100, level=level)), 1
+
+
+benchmark('image_256')(lambda: _image(color.COLOR_256))
+benchmark('image_true')(lambda: _image(color.COLOR_TRUE))
+
+
+def _screen(changes):
+    # a 200x50 dashboard, updating ``changes`` cells of a column per frame
+    screen = Screen(200, 50)
+    styles = [color.green, color.bold + color.red]
+    for y in range(50):
+        screen.put(0, y, 'service {:<3} '.format(y) + '.' * 180, styles[y % 2])
+    screen.render()
+    frame = [0]
+
+    def run():
+        frame[0] += 1
+        for y in range(changes):
+            screen.put(12, y, str(frame[0] % 10), styles[frame[0] % 2])
+        screen.render()
+    return run, 1
+
+
+benchmark('screen.10_cells')(lambda: _screen(10))
+benchmark('screen.50_cells')(lambda: _screen(50))
+
+
+@benchmark('screen.full_redraw')
+def _screen_full_redraw():
+    screen = Screen(200, 50)
+    for y in range(50):
+        screen.put(0, y, 'service {:<3} '.format(y) + '.' * 180, color.green)
+
+    def run():
+        screen.invalidate()
+        screen.render()
+    return run, 1
+
+
+@benchmark('parse_ansi')
+def _parse_ansi():
+    # a captured log of about 2MB, in ns per character: MB/s is 1000 / ns
+    lines = []
+    for i in range(20000):
+        lines.append('{} {} {} request handled in {} ms'.format(
+            color.grayscale[i % 24]('2024-01-01 12:00:%02d' % (i % 60)),
+            color.green('INFO') if i % 3 else color.bold(color.red('ERROR')),
+            color.fg256('276F86', 'worker-%d' % (i % 8)), i))
+    log = '\n'.join(lines)
+    return (lambda: parse_ansi(log)), len(log)
+
+
+@benchmark('rgb_to_xterm.cold')
+def _rgb_to_xterm_cold():
+    colors = _colors(1000)
+    rgb_to_xterm = color.rgb_to_xterm
+
+    def run():
+        rgb_to_xterm.cache_clear()
+        for c in colors:
+            rgb_to_xterm(*c)
+    return run, len(colors)
+
+
+@benchmark('rgb_to_xterm.warm')
+def _rgb_to_xterm_warm():
+    colors = _colors(1000)
+    rgb_to_xterm = color.rgb_to_xterm
+    for c in colors:
+        rgb_to_xterm(*c)
+
+    def run():
+        for c in colors:
+            rgb_to_xterm(*c)
+    return run, len(colors)
+
+
+@benchmark('rgb_to_xterm_perceptual.cold')
+def _rgb_to_xterm_perceptual_cold():
+    colors = _colors(1000)
+    nearest = color.rgb_to_xterm_perceptual
+    for c in colors:  # build their grid cells
+        nearest(*c)
+
+    def run():
+        nearest.cache_clear()
+        for c in colors:
+            nearest(*c)
+    return run, len(colors)
+
+
+@benchmark('rgb_to_xterm_perceptual.warm')
+def _rgb_to_xterm_perceptual_warm():
+    colors = _colors(1000)
+    nearest = color.rgb_to_xterm_perceptual
+    for c in colors:
+        nearest(*c)
+
+    def run():
+        for c in colors:
+            nearest(*c)
+    return run, len(colors)
+
+
+@benchmark('rgb_to_xterm_lut')
+def _rgb_to_xterm_lut():
+    colors = _colors(1000)
+    lut = color.rgb_to_xterm_lut
+    color.xterm_table()
+
+    def run():
+        for c in colors:
+            lut(*c)
+    return run, len(colors)
+
+
+@benchmark('hex_to_rgb.cold')
+def _hex_to_rgb_cold():
+    hexes = _hexes(1000)
+    hex_to_rgb = color.hex_to_rgb
+
+    def run():
+        hex_to_rgb.cache_clear()
+        for h in hexes:
+            hex_to_rgb(h)
+    return run, len(hexes)
+
+
+@benchmark('hex_to_rgb.warm')
+def _hex_to_rgb_warm():
+    hexes = _hexes(1000)
+    hex_to_rgb = color.hex_to_rgb
+    for h in hexes:
+        hex_to_rgb(h)
+
+    def run():
+        for h in hexes:
+            hex_to_rgb(h)
+    return run, len(hexes)
+
+
+def regex_hex_to_rgb(hx):
+    """The previous implementation of hex_to_rgb, for comparison"""
+    hxlen = len(hx)
+    if hxlen != 3 and hxlen != 6:
+        raise ValueError('hx color must be of length 3 or 6')
+    if hxlen == 3:
+        hx = ''.join(i * 2 for i in hx)
+    parts = [int(h, 16) for h in re.split(r'(..)(..)(..)', hx)[1:4]]
+    return tuple(parts)
+
+
+@benchmark('hex_to_rgb.uncached')
+def _hex_to_rgb_uncached():
+    hexes = _hexes(1000)
+    hex_to_rgb = color.hex_to_rgb._origin
+
+    def run():
+        for h in hexes:
+            hex_to_rgb(h)
+    return run, len(hexes)
+
+
+@benchmark('hex_to_rgb.regex')
+def _hex_to_rgb_regex():
+    # what hex_to_rgb.uncached replaced
+    hexes = _hexes(1000)
+
+    def run():
+        for h in hexes:
+            regex_hex_to_rgb(h)
+    return run, len(hexes)
+
+
+def _import_time(module, path=ROOT):
+    env = dict(os.environ, PYTHONPATH=path)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import ' + module]
+
+    def run():
+        err = subprocess.run(cmd, env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+        line = [line for line in err.splitlines() if line.endswith('| ' + module)][-1]
+        # cumulative microseconds, the subprocess itself is not what is measured
+        run.measured.append(int(line.split('|')[1]) * 1e-6)
+    run.measured = []
+    run()  # write bytecode
+    return run
+
+
+benchmark('import')(lambda: (_import_time('color'), 1))
+benchmark('compat.import')(lambda: (_import_time('color_compat'), 1))
+
+
+@benchmark('import.eager')
+def _import_eager():
+    # what importing cost when everything was built eagerly, to compare with import
+    import tempfile
+    tmp = tempfile.mkdtemp()
+    with open(os.path.join(tmp, 'eager_color.py'), 'w') as f:
+        f.write('import typing, re, color\n'
+                '[getattr(color, n) for n in color.__all__]\n')
+    return _import_time('eager_color', os.pathsep.join([tmp, ROOT])), 1
+
+
+def measure(name, quick=False):
+    """Returns the best seconds per operation of a benchmark"""
+    func, ops = BENCHMARKS[name]()
+    if hasattr(func, 'measured'):
+        for _ in range(2 if quick else 7):
+            func()
+        return min(func.measured) / ops
+
+    timer = timeit.Timer(func)
+    if quick:
+        number, repeat = 1, 1
+    else:
+        number, _ = timer.autorange()
+        repeat = 5
+    return min(timer.repeat(repeat=repeat, number=number)) / number / ops
+
+
+def run(names=None, quick=False):
+    """Runs benchmarks with color enabled, returns a dict of name -> ns per op"""
+    # restored afterwards, so that callers like the tests keep their settings
+    no_tty, compat_no_tty = color._use_color_no_tty, color_compat._use_color_no_tty
+    no_color = os.environ.pop('NO_COLOR', None)
+    color.use_color_no_tty(True)
+    color_compat.use_color_no_tty(True)
+    try:
+        results = {}
+        for name in BENCHMARKS:
+            if names and not any(name.startswith(n) for n in names):
+                continue
+            results[name] = measure(name, quick) * 1e9
+        return results
+    finally:
+        color.use_color_no_tty(no_tty)
+        color_compat.use_color_no_tty(compat_no_tty)
+        if no_color is not None:
+            os.environ['NO_COLOR'] = no_color
+        color.reset_color_support()
+
+
+def compare(results, baseline, threshold):
+    """Returns a dict of name -> (ns per op, baseline, ratio, regressed)"""
+    rows = {}
+    for name, ns in results.items():
+        base = baseline.get(name)
+        ratio = ns / base if base else None
+        rows[name] = (ns, base, ratio, ratio is not None and ratio > threshold)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of color.py')
+    parser.add_argument('names', nargs='*', help='benchmark names or prefixes')
+    parser.add_argument('--save', metavar='FILE', help='save results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a baseline')
+    parser.add_argument('--threshold', type=float, default=1.25, help='max slowdown ratio to the baseline')
+    parser.add_argument('--quick', action='store_true', help='run each benchmark briefly')
+    args = parser.parse_args(argv)
+
+    results = run(args.names, args.quick)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    table = Table(['benchmark', 'ns/op', 'baseline', 'ratio'], align='lrrr')
+    rows = compare(results, baseline, args.threshold)
+    for name, (ns, base, ratio, regressed) in rows.items():
+        ratio_cell = '' if ratio is None else ('{:.2f}'.format(ratio), color.red if regressed else color.green)
+        table.add_row(name, '{:.0f}'.format(ns), '' if base is None else '{:.0f}'.format(base), ratio_cell)
+    print(table.render())
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    regressions = [name for name, row in rows.items() if row[3]]
+    if regressions:
+        print('regressions over {}x: {}'.format(args.threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import benchmark  # NOQA
+import color  # NOQA
+
+
+def test_benchmarks_run():
+    names = [name for name in benchmark.BENCHMARKS if 'import' not in name]
+    results = benchmark.run(names, quick=True)
+    assert sorted(results) == sorted(names)
+    assert all(ns > 0 for ns in results.values())
+
+
+def test_run_restores_settings(monkeypatch):
+    monkeypatch.setenv('NO_COLOR', '1')
+    color.use_color_no_tty(False)
+    try:
+        benchmark.run(['named_colors'], quick=True)
+        assert os.environ['NO_COLOR'] == '1'
+        assert color._use_color_no_tty is False
+        assert not color.use_color()
+    finally:
+        color.use_color_no_tty(True)
+
+
+def test_compare_threshold():
+    rows = benchmark.compare({'a': 130.0, 'b': 110.0, 'c': 50.0}, {'a': 100.0, 'b': 100.0}, 1.25)
+    assert rows['a'][3] is True
+    assert rows['b'][3] is False
+    assert rows['c'] == (50.0, None, None, False)
+
+
+def test_main_save_and_compare(tmp_path, capsys):
+    path = str(tmp_path / 'baseline.json')
+    assert benchmark.main(['--quick', '--save', path, 'named_colors']) == 0
+    with open(path, 'w') as f:
+        f.write('{"named_colors": 0.001}')
+    assert benchmark.main(['--quick', '--compare', path, 'named_colors']) == 1
+    assert 'regressions' in capsys.readouterr().out
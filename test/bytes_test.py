@@ -0,0 +1,56 @@
+# coding: utf-8
+
+import io
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+color_names = ['red', 'green', 'yellow', 'blue', 'magenta', 'cyan']
+
+
+def test_named_colors(colored):
+    for name in color_names:
+        for func in (getattr(color, name), getattr(color, name + '_bg'), getattr(color, name + '_hl')):
+            assert func(b'x') == func('x').encode()
+    for name in ['bold', 'italic', 'underline', 'strike', 'blink']:
+        assert getattr(color, name)(b'x') == getattr(color, name)('x').encode()
+    assert (color.bold + color.red)(b'\xff') == b'\x1b[1;31m\xff\x1b[22;39m'
+    assert color.grayscale_hl[0](b'x') == color.grayscale_hl[0]('x').encode()
+    assert color.make_color(color.esc(31), color.FG_END)(b'x') == b'\x1b[31mx\x1b[39m'
+
+
+def test_256_colors(colored):
+    for func in (color.fg256, color.bg256, color.hl256):
+        assert func('912D2B', b'\xff') == func('912D2B', 'x').encode().replace(b'x', b'\xff')
+        assert func(b'555', b'x') == func('555', 'x').encode()
+    assert color.FG256_PREFIXES_B[88] == b'\x1b[38;5;88m'
+    assert color.HL256_PREFIXES_B[1] == b'\x1b[1;38;5;1;7m'
+
+
+@pytest.mark.parametrize('env', [{'COLORTERM': 'truecolor'}, {}, {'TERM': 'linux'}])
+def test_truecolor(colored, monkeypatch, env):
+    for k, v in env.items():
+        monkeypatch.setenv(k, v)
+    color.reset_color_support()
+    for func in (color.fgtrue, color.bgtrue, color.hltrue):
+        assert func('912D2B', b'x') == func('912D2B', 'x').encode()
+
+
+def test_no_color_returns_input(colored):
+    with color.color_context(False):
+        assert color.red(b'x') == b'x'
+        assert color.fg256('fff', b'x') == b'x'
+
+
+def test_writer_binary_stream():
+    stream = io.BytesIO()
+    with color.ColorWriter(stream, color=True) as w:
+        w.write(color.red, b'\xff')
+        w.write(color.red_hl, b'a')
+        w.write(None, 'ä')
+    assert stream.getvalue() == b'\x1b[31m\xff\x1b[1;7ma\x1b[22;27;39m' + 'ä'.encode()
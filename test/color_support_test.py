@@ -0,0 +1,86 @@
+# coding: utf-8
+
+import io
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+class FakeTTY(io.StringIO):
+    def __init__(self, tty=True):
+        super().__init__()
+        self.tty = tty
+        self.isatty_calls = 0
+
+    def isatty(self):
+        self.isatty_calls += 1
+        return self.tty
+
+
+def test_detection_is_cached(colored, monkeypatch):
+    stream = FakeTTY()
+    monkeypatch.setattr('sys.stdout', stream)
+    for _ in range(100):
+        color.red('red')
+        color.fg256('912D2B', 'red')
+    assert stream.isatty_calls == 1
+
+
+def test_stdout_swap_resolves_again(colored, monkeypatch):
+    monkeypatch.setattr('sys.stdout', FakeTTY())
+    color.use_color_no_tty(False)
+    assert color.use_color()
+
+    monkeypatch.setattr('sys.stdout', FakeTTY(tty=False))
+    assert not color.use_color()
+    assert color.red('red') == 'red'
+
+
+def test_use_color_no_tty_invalidates(colored, monkeypatch):
+    monkeypatch.setattr('sys.stdout', FakeTTY(tty=False))
+    assert color.use_color()
+    color.use_color_no_tty(False)
+    assert not color.use_color()
+    color.use_color_no_tty(True)
+    assert color.red('red') == '\x1b[31mred\x1b[39m'
+
+
+def test_reset_color_support(colored, monkeypatch):
+    monkeypatch.setattr('sys.stdout', FakeTTY())
+    assert color.use_color()
+    monkeypatch.setenv('NO_COLOR', '1')
+    assert color.use_color()
+    color.reset_color_support()
+    assert not color.use_color()
+
+
+@pytest.mark.parametrize('env, tty, no_tty, level', [
+    ({}, True, False, color.COLOR_256),
+    ({}, False, False, color.COLOR_NONE),
+    ({}, False, True, color.COLOR_256),
+    ({'NO_COLOR': '1'}, True, True, color.COLOR_NONE),
+    ({'NO_COLOR': '', 'TERM': 'xterm'}, True, True, color.COLOR_256),
+    ({'FORCE_COLOR': '1'}, False, False, color.COLOR_256),
+    ({'FORCE_COLOR': '0'}, True, True, color.COLOR_NONE),
+    ({'FORCE_COLOR': '1', 'TERM': 'dumb'}, True, True, color.COLOR_256),
+    ({'TERM': 'dumb'}, True, True, color.COLOR_NONE),
+    ({'TERM': 'linux'}, True, True, color.COLOR_16),
+    ({'TERM': 'xterm-256color'}, True, True, color.COLOR_256),
+    ({'COLORTERM': 'truecolor'}, True, True, color.COLOR_TRUE),
+    ({'COLORTERM': '24bit'}, False, True, color.COLOR_TRUE),
+])
+def test_detect_color_level(colored, env, tty, no_tty, level):
+    color.use_color_no_tty(no_tty)
+    assert color.detect_color_level(FakeTTY(tty), env) == level
+
+
+def test_closed_stream(colored):
+    color.use_color_no_tty(False)
+    stream = io.StringIO()
+    stream.close()
+    assert color.detect_color_level(stream, {}) == color.COLOR_NONE
@@ -0,0 +1,85 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+def test_steps_and_dedup():
+    g = color.Gradient(['000000', 'ffffff'], 100)
+    assert len(g) == 100
+    # every step snaps to a gray, adjacent equal colors share the style object
+    assert g.xterms[0] == 232
+    assert g.xterms[-1] == 255
+    assert all(x >= 232 for x in g.xterms)
+    assert len(g.runs) == len(set(g.xterms))
+    assert sum(count for _, count in g.runs) == 100
+    assert g[0] is g[1]
+    assert list(g) == list(g.styles)
+
+
+def test_multiple_colors():
+    g = color.Gradient([(0, 255, 0), 'ffff00', '#ff0000'], 5)
+    assert g.xterms == (46, 118, 226, 208, 196)
+    assert g[2] == color.Style(38, 5, 226)
+
+
+def test_layers():
+    assert color.Gradient(['000', 'fff'], 2, layer='bg')[1].codes == (48, 5, 255)
+    assert color.Gradient(['000', 'fff'], 2, layer='hl')[1].codes == (1, 38, 5, 255, 7)
+    with pytest.raises(ValueError):
+        color.Gradient(['000', 'fff'], 2, layer='ul')
+
+
+def test_perceptual():
+    g = color.Gradient([(0x80, 0x82, 0x80), (0x80, 0x82, 0x80)], 2, perceptual=True)
+    assert g.xterms == (244, 244)
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        color.Gradient(['000'], 10)
+    with pytest.raises(ValueError):
+        color.Gradient(['000', 'fff'], 0)
+
+
+def test_at():
+    g = color.Gradient(['000000', 'ffffff'], 10)
+    assert g.at(0) is g[0]
+    assert g.at(0.55) is g[5]
+    assert g.at(1) is g[9]
+    assert g.at(-1) is g[0]
+    assert g.at(7) is g[9]
+
+
+def test_render(colored):
+    g = color.Gradient(['ff0000', 'ff0000', '0000ff'], 4)
+    assert g.xterms == (196, 196, 125, 21)
+    assert g.render('abcd') == '\x1b[38;5;196mab\x1b[38;5;125mc\x1b[38;5;21md\x1b[39m'
+    assert g.render('ab') == '\x1b[38;5;196mab\x1b[39m'
+    assert g.render('abc') == '\x1b[38;5;196mab\x1b[38;5;125mc\x1b[39m'
+    assert g.render('') == ''
+
+
+def test_render_longer_than_steps(colored):
+    g = color.Gradient(['00ff00', 'ff0000'], 5)
+    assert color.strip_ansi(g.render('abcdefghij')) == 'abcdefghij'
+    assert g.render('abcdefghij').endswith(g[-1].start + 'efghij\x1b[39m')
+    assert color.Gradient(['ff0000', '0000ff'], 2).render('abc') == '\x1b[38;5;196ma\x1b[38;5;21mbc\x1b[39m'
+
+
+def test_render_same_as_styles(colored):
+    g = color.Gradient(['00ff00', 'ffff00', 'ff0000'], 50)
+    text = 'x' * 50
+    expected = ''.join(style(c) for style, c in zip(g, text))
+    assert color.minimize_sgr(g.render(text)) == color.minimize_sgr(expected)
+
+
+def test_render_no_color(colored):
+    with color.color_context(False):
+        assert color.Gradient(['000', 'fff'], 3).render('abc') == 'abc'
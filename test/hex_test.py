@@ -0,0 +1,55 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from benchmark import regex_hex_to_rgb  # NOQA
+from rgbxterm_test import CLUT  # NOQA
+
+
+hex_to_rgb = color.hex_to_rgb._origin
+
+
+def test_same_as_regex():
+    for _, hex in CLUT:
+        assert hex_to_rgb(hex) == regex_hex_to_rgb(hex)
+        assert hex_to_rgb(hex.upper()) == regex_hex_to_rgb(hex.upper())
+    for i in range(4096):
+        hex = '{:03x}'.format(i)
+        assert hex_to_rgb(hex) == regex_hex_to_rgb(hex)
+
+
+@pytest.mark.parametrize('hx, rgb', [
+    ('912D2B', (0x91, 0x2d, 0x2b)),
+    ('#912D2B', (0x91, 0x2d, 0x2b)),
+    ('912D2B80', (0x91, 0x2d, 0x2b)),
+    ('#912d2bff', (0x91, 0x2d, 0x2b)),
+    ('#555', (0x55, 0x55, 0x55)),
+    ('a0f', (0xaa, 0x00, 0xff)),
+    (b'912D2B', (0x91, 0x2d, 0x2b)),
+    (b'#a0f', (0xaa, 0x00, 0xff)),
+    (b'00000000', (0, 0, 0)),
+])
+def test_forms(hx, rgb):
+    assert hex_to_rgb(hx) == rgb
+    assert color.hex_to_rgb(hx) == rgb
+
+
+@pytest.mark.parametrize('hx', [
+    '', '#', 'ff', 'ffff', '1234567', '#12345', 'gggggg', '0x0fff', ' fffff', '+fffff', 'ff_ff0', '12345é',
+    b'', b'0x0fff', b'ggg',
+])
+def test_invalid(hx):
+    with pytest.raises(ValueError):
+        hex_to_rgb(hx)
+
+
+def test_256_functions_accept_new_forms(colored):
+    assert color.fg256('#912D2B', 'x') == color.fg256('912D2B', 'x')
+    assert color.bg256(b'912D2B', 'x') == color.bg256('912D2B', 'x')
+
@@ -0,0 +1,70 @@
+# coding: utf-8
+
+import os
+import random
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_image import _xterm_colors, rasterize, render  # NOQA
+
+
+RED, BLUE, GRAY = (255, 0, 0), (0, 0, 255), (1, 2, 3)
+
+
+def image(*pixels):
+    return bytes(v for p in pixels for v in p)
+
+
+def test_xterm_colors_match_rgb_to_xterm():
+    rand = random.Random(0)
+    data = bytes(rand.randrange(256) for _ in range(3 * 5000)) + image(*((v, v, v) for v in range(256)))
+    rs, gs, bs = data[0::3], data[1::3], data[2::3]
+    assert list(_xterm_colors(rs, gs, bs)) == [color.rgb_to_xterm._origin(*p) for p in zip(rs, gs, bs)]
+
+
+def test_256():
+    out = render(image(RED, BLUE, BLUE, RED), 2, 2, level=color.COLOR_256)
+    assert out == '\x1b[38;5;196;48;5;21m▀\x1b[38;5;21;48;5;196m▀\x1b[39;49m'
+
+
+def test_truecolor():
+    out = render(image(RED, RED, BLUE, GRAY), 2, 2, level=color.COLOR_TRUE)
+    assert out == '\x1b[38;2;255;0;0;48;2;0;0;255m▀\x1b[48;2;1;2;3m▀\x1b[39;49m'
+
+
+def test_16():
+    out = render(image(RED, BLUE), 1, 2, level=color.COLOR_16)
+    assert out == '\x1b[91;104m▀\x1b[39;49m'
+
+
+def test_reuses_escapes():
+    out = render(image(*[RED] * 20, *[BLUE] * 20), 20, 2, level=color.COLOR_256)
+    assert out == '\x1b[38;5;196;48;5;21m' + '▀' * 20 + '\x1b[39;49m'
+
+
+def test_odd_height_keeps_background():
+    lines = list(rasterize(image(RED, BLUE, GRAY), 1, 3, level=color.COLOR_256))
+    assert lines == ['\x1b[38;5;196;48;5;21m▀\x1b[39;49m', '\x1b[38;5;16m▀\x1b[39;49m']
+
+
+def test_rgba_and_memoryview():
+    rgba = bytearray([255, 0, 0, 9, 0, 0, 255, 9])
+    assert render(memoryview(rgba), 1, 2, channels=4, level=color.COLOR_256) == \
+        render(image(RED, BLUE), 1, 2, level=color.COLOR_256)
+
+
+def test_no_color():
+    assert render(image(RED, BLUE), 1, 2, level=color.COLOR_NONE) == '▀'
+
+
+def test_default_level(colored):
+    assert render(image(RED, BLUE), 1, 2) == render(image(RED, BLUE), 1, 2, level=color.COLOR_256)
+
+
+def test_size_mismatch():
+    with pytest.raises(ValueError):
+        render(image(RED), 2, 1)
@@ -0,0 +1,43 @@
+# coding: utf-8
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run(
+        [sys.executable, '-c', code], env=env, cwd=ROOT,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    return out.stdout, out.stderr
+
+
+def test_import_is_lazy():
+    code = 'import sys; before = set(sys.modules); import color; print(sorted(set(sys.modules) - before)); print(sorted(vars(color)))'
+    out, _ = run(code)
+    imported, names = [eval(line) for line in out.splitlines()]
+    assert 're' not in imported
+    assert 'typing' not in imported
+    for name in ('red', 'bold', 'grayscale', 'fg256', 'FG256_PREFIXES', 'fgtrue'):
+        assert name not in names
+
+
+def test_lazy_attributes():
+    assert 'fg256' in dir(color)
+    assert 'fg256' in color.__all__
+    assert 'ContextVar' not in color.__all__
+    assert color.red is color.red
+    assert color.fg256.prefixes is color.FG256_PREFIXES
+    with pytest.raises(AttributeError):
+        color.no_such_color
+
@@ -0,0 +1,115 @@
+# coding: utf-8
+
+import logging
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_logging import ColorFormatter  # NOQA
+
+
+def make_record(level, msg='hello', name='app'):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+def test_levelname(colored):
+    f = ColorFormatter('%(levelname)s %(name)s: %(message)s')
+    record = make_record(logging.WARNING)
+    assert f.format(record) == '\x1b[33mWARNING\x1b[39m app: hello'
+    assert record.levelname == 'WARNING'
+    assert f.format(make_record(logging.CRITICAL)) == '\x1b[1;31mCRITICAL\x1b[22;39m app: hello'
+
+
+def test_levelname_cached(colored):
+    f = ColorFormatter('%(levelname)s')
+    f.format(make_record(logging.INFO))
+    f.format(make_record(logging.INFO))
+    assert list(f._levelnames) == [(logging.INFO, 'INFO')]
+
+
+def test_line(colored):
+    f = ColorFormatter('%(levelname)s: %(message)s', line=True)
+    assert f.format(make_record(logging.ERROR)) == '\x1b[31mERROR: hello\x1b[39m'
+
+
+def test_custom_levels(colored):
+    f = ColorFormatter('%(levelname)s', level_styles={logging.INFO: color.blue, 100: color.magenta})
+    assert f.format(make_record(25)) == '\x1b[34mLevel 25\x1b[39m'
+    assert f.format(make_record(logging.DEBUG)) == 'DEBUG'
+    assert f.format(make_record(100)) == '\x1b[35mLevel 100\x1b[39m'
+
+
+def test_plain_when_no_color(colored):
+    plain = logging.Formatter('%(levelname)s %(message)s')
+    record = make_record(logging.ERROR)
+    assert ColorFormatter('%(levelname)s %(message)s', use_color=False).format(record) == plain.format(record)
+    with color.color_context(False):
+        assert ColorFormatter('%(levelname)s %(message)s').format(record) == plain.format(record)
+
+
+def test_handler(colored):
+    import io
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(ColorFormatter('%(levelname)s %(message)s', use_color=True))
+    logger = logging.getLogger('color_logging_test')
+    logger.addHandler(handler)
+    logger.propagate = False
+    try:
+        logger.error('failed %s', 'x')
+    finally:
+        logger.removeHandler(handler)
+    assert stream.getvalue() == '\x1b[31mERROR\x1b[39m failed x\n'
+
+
+def test_validate_and_defaults(colored):
+    with pytest.raises(ValueError):
+        ColorFormatter('%(message', validate=True)
+    ColorFormatter('%(message', None, '%', False)
+    f = ColorFormatter('%(levelname)s %(tag)s %(message)s', defaults={'tag': '-'})
+    assert f.format(make_record(logging.INFO)) == '\x1b[32mINFO\x1b[39m - hello'
+
+
+def test_dict_config(colored):
+    import io
+    import logging.config
+    stream = io.StringIO()
+    logging.config.dictConfig({
+        'version': 1,
+        'incremental': False,
+        'disable_existing_loggers': False,
+        'formatters': {'color': {
+            'class': 'color_logging.ColorFormatter',
+            'format': '%(levelname)s %(message)s',
+            'validate': True,
+        }},
+        'handlers': {'stream': {'class': 'logging.StreamHandler', 'formatter': 'color', 'stream': stream}},
+        'loggers': {'color_logging_dict_test': {'handlers': ['stream'], 'propagate': False}},
+    })
+    logger = logging.getLogger('color_logging_dict_test')
+    try:
+        logger.warning('careful')
+    finally:
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+    assert stream.getvalue() == '\x1b[33mWARNING\x1b[39m careful\n'
+
+
+@pytest.mark.parametrize('fmt, style, expected', [
+    ('%(levelname)-8s|%(message)s', '%', '\x1b[32mINFO    \x1b[39m|hello'),
+    ('%(levelname)8s|%(message)s', '%', '\x1b[32m    INFO\x1b[39m|hello'),
+    ('%(levelname).1s|%(message)s', '%', '\x1b[32mI\x1b[39m|hello'),
+    ('{levelname:<8}|{message}', '{', '\x1b[32mINFO    \x1b[39m|hello'),
+    ('{levelname:^8}|{message}', '{', '\x1b[32m  INFO  \x1b[39m|hello'),
+])
+def test_levelname_width(colored, fmt, style, expected):
+    record = make_record(logging.INFO)
+    assert ColorFormatter(fmt, style=style).format(record) == expected
+    assert record.levelname == 'INFO'
+    plain = logging.Formatter(fmt, style=style).format(record)
+    assert ColorFormatter(fmt, style=style, use_color=False).format(record) == plain
+    assert color.strip_ansi(ColorFormatter(fmt, style=style, line=True).format(record)) == plain
@@ -0,0 +1,70 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_markup import compile_markup, markup, parse_style  # NOQA
+
+
+def test_markup(colored):
+    out = markup('[bold red]{name}[/] [bg256=E0B4B4]{msg}[/]', name='db', msg='down')
+    assert out == '\x1b[1;31mdb\x1b[22;39m \x1b[48;5;181mdown\x1b[49m'
+    assert color.strip_ansi(out) == 'db down'
+
+
+def test_same_as_functions(colored):
+    out = markup('[bold red]{}[/] [cyan_bg]{}[/]', 'a', 'b')
+    expected = color.bold(color.red('a')) + ' ' + color.cyan_bg('b')
+    assert color.minimize_sgr(out) == color.minimize_sgr(expected)
+
+
+def test_nested_emits_differences(colored):
+    m = compile_markup('[bold][red]a[/]b[/]c')
+    assert m.styled == '\x1b[1;31ma\x1b[39mb\x1b[22mc'
+    assert m.plain == 'abc'
+
+
+def test_256_colors(colored):
+    assert markup('[fg256=912D2B]x[/]') == color.fg256('912D2B', 'x')
+    assert markup('[hl256=10a3a3]x[/]') == '\x1b[1;38;5;37;7mx\x1b[22;27;39m'
+
+
+def test_literals(colored):
+    assert markup('[[x] {{y}} [1/3]') == '[x] {y} [1/3]'
+    assert markup('[red]{v}[/]', v='[bold]') == '\x1b[31m[bold]\x1b[39m'
+
+
+def test_fields_are_not_tags(colored):
+    assert markup('{d[key]}', d={'key': 'v'}) == 'v'
+    assert markup('[red]{d[red]}[/]', d={'red': 'v'}) == '\x1b[31mv\x1b[39m'
+    assert markup('{0[bold]:>{1}}', {'bold': 'b'}, 3) == '  b'
+    assert markup('{{[red]x[/]}}') == '{\x1b[31mx\x1b[39m}'
+
+
+def test_unclosed_tags_close_at_end(colored):
+    assert markup('[underline]x') == '\x1b[4mx\x1b[24m'
+
+
+def test_invalid():
+    for template in ('[nope]x', '[fg=fff]x', 'x[/]', '[/red]', '[grayscale]x', '[fg256=xyz]x'):
+        with pytest.raises(ValueError):
+            compile_markup(template)
+
+
+def test_cached():
+    assert compile_markup('[red]{}[/]') is compile_markup('[red]{}[/]')
+
+
+def test_parse_style():
+    assert parse_style('bold red') == color.bold + color.red
+    assert parse_style('bg256=fff') == color.Style(48, 5, 255)
+
+
+def test_no_color(colored):
+    with color.color_context(False):
+        assert markup('[red]{}[/]', 'x') == 'x'
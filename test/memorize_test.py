@@ -1,25 +1,66 @@
 # coding: utf-8
 
+import os
+
+import pytest
+
 import color
-import time
 
 
-rgb_tuple = (100, 150, 200)
+lru_only = pytest.mark.skipif(bool(os.getenv('COLOR_COMPAT')), reason='color.py only')
+
+
+@lru_only
+def test_memorize_lru_eviction():
+    calls = []
+
+    @color.memorize(maxsize=2)
+    def double(x):
+        calls.append(x)
+        return x * 2
+
+    assert double(1) == 2
+    assert double(2) == 4
+    assert double(1) == 2  # hit, 1 becomes the most recent
+    assert double(3) == 6  # evicts 2
+    assert double(1) == 2
+    assert double(2) == 4
+    assert calls == [1, 2, 3, 2]
+    info = double.cache_info()
+    assert (info.hits, info.misses, info.evictions, info.maxsize, info.currsize) == (2, 4, 2, 2, 2)
+
+    double.cache_clear()
+    assert double.cache_info() == (0, 0, 0, 2, 0)
+
+
+@lru_only
+def test_memorize_unbounded():
+    @color.memorize
+    def double(x):
+        return x * 2
+
+    for i in range(100):
+        double(i)
+        double(i)
+    assert double.cache_info() == (100, 100, 0, None, 100)
+
 
+@lru_only
+def test_memorize_maxsize_zero():
+    @color.memorize(maxsize=0)
+    def double(x):
+        return x * 2
 
-def with_memorize_test():
-    print('Run 10000 times')
-    t0 = time.time()
-    for _ in range(10000):
-        color.rgb_to_xterm(*rgb_tuple)
-    tr = int((time.time() - t0) * 1000)
-    print('Cost {} ms'.format(tr))
+    assert double(1) == double(1) == 2
+    assert double.cache_info() == (0, 2, 0, 0, 0)
 
 
-def without_memorize_test():
-    print('Run 10000 times')
-    t0 = time.time()
-    for _ in range(10000):
-        color.rgb_to_xterm._origin(*rgb_tuple)
-    tr = int((time.time() - t0) * 1000)
-    print('Cost {} ms'.format(tr))
+@lru_only
+def test_color_caches_are_bounded():
+    color.rgb_to_xterm.cache_clear()
+    for i in range(color.CACHE_MAXSIZE + 10):
+        color.rgb_to_xterm(i % 256, i // 256, 7)
+    info = color.rgb_to_xterm.cache_info()
+    assert info.currsize == color.CACHE_MAXSIZE
+    assert info.evictions == 10
+    assert color.hex_to_rgb.cache_info().maxsize == color.CACHE_MAXSIZE
@@ -0,0 +1,80 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_text import Text, parse_ansi  # NOQA
+
+
+def sid(style):
+    return color.style_registry.intern(style)
+
+
+def test_plain():
+    assert parse_ansi('no escapes') == Text('no escapes')
+    assert parse_ansi('') == Text()
+
+
+def test_named_and_nested(colored):
+    t = parse_ansi(color.bold(color.red('error')) + ': ' + color.cyan('x'))
+    assert t.plain == 'error: x'
+    assert list(t.span_tuples()) == [(0, 5, sid(color.bold + color.red)), (7, 8, sid(color.cyan))]
+
+
+def test_256_and_hl_resets(colored):
+    t = parse_ansi(color.fg256('912D2B', 'a') + color.bg256('E0B4B4', 'b') + color.hl256('10a3a3', 'c') + 'd')
+    assert t.plain == 'abcd'
+    assert list(t.span_tuples()) == [
+        (0, 1, sid(color.Style(38, 5, 88))),
+        (1, 2, sid(color.Style(48, 5, 181))),
+        (2, 3, sid(color.Style(1, 38, 5, 37, 7))),
+    ]
+
+
+def test_truecolor_and_full_reset():
+    t = parse_ansi('\x1b[1;38;2;1;2;3mab\x1b[0mc\x1b[mx')
+    assert list(t.span_tuples()) == [(0, 2, sid(color.Style(1, 38, 2, 1, 2, 3)))]
+
+
+def test_partial_reset_keeps_the_rest():
+    t = parse_ansi('\x1b[1;31ma\x1b[22mb\x1b[39mc')
+    assert list(t.span_tuples()) == [(0, 1, sid(color.bold + color.red)), (1, 2, sid(color.red))]
+
+
+def test_merges_redundant_sequences():
+    t = parse_ansi('\x1b[31ma\x1b[31mb\x1b[0m\x1b[31mc\x1b[0m')
+    assert list(t.span_tuples()) == [(0, 3, sid(color.red))]
+
+
+def test_other_sequences_dropped():
+    s = '\x1b[2J\x1b[1;1H\x1b]8;;http://example.com\x1b\\link\x1b]8;;\x1b\\ \x1b(B\x1b[?25lok'
+    assert parse_ansi(s) == Text('link ok')
+
+
+def test_unsupported_attributes_dropped():
+    t = parse_ansi('\x1b[53;31mover\x1b[0m')
+    assert list(t.span_tuples()) == [(0, 4, sid(color.red))]
+
+
+def test_round_trip(colored):
+    s = color.bold(color.yellow('warn')) + ' ' + color.hl256('555', 'x') + color.grayscale[3]('y')
+    t = Text.from_ansi(s)
+    assert parse_ansi(t.render()) == t
+    hl = Text.styled('z', color.Style(1, 38, 5, 255, 7))
+    assert parse_ansi(hl.render()) == hl
+    assert t.plain == color.strip_ansi(s)
+    assert t.wrap(3)[0].render() == '\x1b[1;33mwar\x1b[22;39m'
+
+
+def test_colon_sub_parameters():
+    red = sid(color.Style(38, 2, 255, 0, 0))
+    assert list(parse_ansi('\x1b[38:2::255:0:0mx\x1b[0m').span_tuples()) == [(0, 1, red)]
+    assert list(parse_ansi('\x1b[38:2:0:255:0:0mx\x1b[0m').span_tuples()) == [(0, 1, red)]
+    assert list(parse_ansi('\x1b[38:2:255:0:0mx\x1b[0m').span_tuples()) == [(0, 1, red)]
+    assert list(parse_ansi('\x1b[1;48:5:208mx\x1b[m').span_tuples()) == [(0, 1, sid(color.Style(1, 48, 5, 208)))]
+    assert list(parse_ansi('\x1b[4:3ma\x1b[4:0mb').span_tuples()) == [(0, 1, sid(color.underline))]
@@ -0,0 +1,53 @@
+# coding: utf-8
+
+import os
+import random
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from rgbxterm_test import CLUT  # NOQA
+
+
+def test_palette_matches_clut():
+    assert [color.hex_to_rgb(hx) for _, hx in CLUT] == list(color.XTERM_PALETTE)
+
+
+def test_oklab():
+    assert color.rgb_to_oklab(255, 255, 255) == pytest.approx((1, 0, 0), abs=1e-4)
+    assert color.rgb_to_oklab(0, 0, 0) == (0, 0, 0)
+    assert color.rgb_to_oklab(255, 0, 0) == pytest.approx((0.62796, 0.22486, 0.12585), abs=1e-4)
+
+
+def test_palette_colors_match_themselves():
+    for x, rgb in enumerate(color.XTERM_PALETTE):
+        found = color.rgb_to_xterm_perceptual(*rgb)
+        # system colors that duplicate a cube or gray color resolve to the latter
+        assert color.XTERM_PALETTE[found] == rgb
+        if x >= 16:
+            assert found == x
+
+
+def test_matches_brute_force():
+    labs = [color.rgb_to_oklab(*rgb) for rgb in color.XTERM_PALETTE]
+    order = list(range(16, 256)) + list(range(16))
+    rand = random.Random(0)
+    for _ in range(2000):
+        rgb = rand.randrange(256), rand.randrange(256), rand.randrange(256)
+        p = color.rgb_to_oklab(*rgb)
+        expected = min(order, key=lambda x: sum((u - v) ** 2 for u, v in zip(p, labs[x])))
+        assert color.rgb_to_xterm_perceptual._origin(*rgb) == expected
+
+
+def test_off_diagonal_gray():
+    # the snapping rgb_to_xterm only uses the grays when all channels are equal
+    assert color.rgb_to_xterm(0x80, 0x82, 0x80) == 102
+    assert color.rgb_to_xterm_perceptual(0x80, 0x82, 0x80) == 244
+
+
+def test_out_of_range():
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm_perceptual(256, 0, 0)
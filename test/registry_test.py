@@ -0,0 +1,79 @@
+# coding: utf-8
+
+import os
+import threading
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+def test_intern():
+    r = color.StyleRegistry()
+    assert r.intern(None) == 0
+    a = r.intern(color.bold + color.red)
+    assert a == 1
+    assert r.intern(color.Style(1, 31)) == a
+    assert r.intern(color.red) == 2
+    assert r.intern(color.red + color.bold) == a
+    assert r[a] == color.bold + color.red
+    assert r[0] is None
+    assert len(r) == 3
+
+
+def test_prefixes():
+    r = color.StyleRegistry()
+    sid = r.intern(color.grayscale[3])
+    assert r.starts[sid] == '\x1b[38;5;235m'
+    assert r.ends[sid] == '\x1b[39m'
+    assert r.bstarts[sid] == b'\x1b[38;5;235m'
+    assert r.bends[sid] == b'\x1b[39m'
+    assert r.starts[0] == r.ends[0] == ''
+
+
+def test_xterm():
+    r = color.StyleRegistry()
+    fg = r.xterm(196)
+    assert r[fg] == color.Style(38, 5, 196)
+    assert r.xterm(196) == fg
+    assert r.intern(color.Style(38, 5, 196)) == fg
+    assert r.starts[r.xterm(196, 'bg')] == color.BG256_PREFIXES[196]
+    assert r.starts[r.xterm(37, 'hl')] == color.HL256_PREFIXES[37]
+    with pytest.raises(ValueError):
+        r.xterm(1, 'ul')
+
+
+def test_transition():
+    r = color.StyleRegistry()
+    a, b = r.intern(color.bold + color.red), r.intern(color.red)
+    assert r.transition(a, b) == color.sgr_transition(color.bold + color.red, color.red) == '\x1b[22m'
+    assert r.transition(0, a) == '\x1b[1;31m'
+    assert r.transition(a, 0) == '\x1b[22;39m'
+    assert r.btransition(a, 0) == b'\x1b[22;39m'
+
+
+def test_intern_from_threads():
+    r = color.StyleRegistry()
+    styles = [color.Style(38, 5, x) for x in range(256)]
+    results = []
+    barrier = threading.Barrier(8)
+
+    def run():
+        barrier.wait()
+        results.append([r.intern(s) for s in styles])
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(ids == results[0] for ids in results)
+    assert len(r) == 257
+    assert [r[i] for i in results[0]] == styles
+
+
+def test_shared_registry():
+    assert color.style_registry.intern(color.red) == color.style_registry.intern(color.Style(31))
@@ -0,0 +1,86 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_screen import Screen  # NOQA
+
+
+def test_first_render_draws_everything(colored):
+    s = Screen(4, 2)
+    s.put(0, 0, 'ab', color.red)
+    assert s.render() == '\x1b[1;1H\x1b[31mab\x1b[39m  \x1b[2;1H    '
+
+
+def test_unchanged_renders_nothing(colored):
+    s = Screen(4, 2)
+    s.put(0, 0, 'ab', color.red)
+    s.render()
+    assert s.render() == ''
+    s.put(0, 0, 'ab', color.red)
+    assert s.render() == ''
+
+
+def test_changed_cells_only(colored):
+    s = Screen(20, 3)
+    s.put(0, 0, 'status: ')
+    s.put(8, 0, 'ok', color.green)
+    s.render()
+    s.put(8, 0, 'failed', color.bold + color.red)
+    assert s.render() == '\x1b[1;9H\x1b[1;31mfailed\x1b[22;39m'
+
+
+def test_style_only_change(colored):
+    s = Screen(3, 1)
+    s.put(0, 0, 'abc', color.red)
+    s.render()
+    s.put(1, 0, 'b', color.blue)
+    assert s.render() == '\x1b[1;2H\x1b[34mb\x1b[39m'
+
+
+def test_runs(colored):
+    s = Screen(20, 1)
+    s.render()
+    s.put(0, 0, 'a')
+    s.put(3, 0, 'b')  # close, drawn in the same run
+    s.put(19, 0, 'c')  # far, after a cursor move
+    assert s.render() == '\x1b[1;1Ha  b\x1b[1;20Hc'
+
+
+def test_transitions_across_runs(colored):
+    s = Screen(20, 2)
+    s.render()
+    s.put(0, 0, 'a', color.red)
+    s.put(0, 1, 'b', color.red + color.bold)
+    assert s.render() == '\x1b[1;1H\x1b[31ma\x1b[2;1H\x1b[1mb\x1b[22;39m'
+
+
+def test_clip_and_out_of_range(colored):
+    s = Screen(3, 1)
+    s.render()
+    s.put(1, 0, 'xyz')
+    s.put(5, 0, 'q')
+    s.put(0, 3, 'q')
+    assert s.render() == '\x1b[1;2Hxy'
+
+
+def test_clear_and_invalidate(colored):
+    s = Screen(2, 1)
+    s.put(0, 0, 'ab')
+    s.render()
+    s.clear()
+    assert s.render() == '\x1b[1;1H  '
+    s.invalidate()
+    assert s.render() == '\x1b[1;1H  '
+
+
+def test_no_color(colored):
+    with color.color_context(False):
+        s = Screen(2, 1)
+        s.put(0, 0, 'ab', color.red)
+        assert s.render() == '\x1b[1;1Hab'
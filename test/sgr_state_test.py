@@ -0,0 +1,87 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+def test_apply():
+    state = color.sgr_apply({}, (1, 31, 48, 5, 100))
+    assert state == {1: (1,), 'fg': (31,), 'bg': (48, 5, 100)}
+    color.sgr_apply(state, (22, 39))
+    assert state == {'bg': (48, 5, 100)}
+    color.sgr_apply(state, (0,))
+    assert state == {}
+
+
+@pytest.mark.parametrize('a, b, codes', [
+    ({}, {}, ()),
+    ({'fg': (31,)}, {'fg': (31,)}, ()),
+    ({'fg': (31,)}, {'fg': (32,)}, (32,)),
+    ({'fg': (31,)}, {'bg': (44,)}, (39, 44)),
+    ({'fg': (31,)}, {'fg': (31,), 1: (1,)}, (1,)),
+    ({1: (1,), 2: (2,)}, {2: (2,)}, (22, 2)),
+    ({'fg': (38, 5, 1), 'bg': (41,), 4: (4,)}, {}, (24, 39, 49)),
+    ({53: (53,)}, {'fg': (31,)}, (0, 31)),
+])
+def test_diff(a, b, codes):
+    assert color.sgr_diff(a, b) == codes
+    # applying the diff to a reaches b
+    assert color.sgr_apply(dict(a), codes) == b
+
+
+def test_transition():
+    assert color.sgr_transition(None, color.red) == '\x1b[31m'
+    assert color.sgr_transition(color.red, None) == '\x1b[39m'
+    assert color.sgr_transition(color.red, color.red_hl) == '\x1b[1;7m'
+    assert color.sgr_transition(color.red_hl, color.red) == '\x1b[22;27m'
+    assert color.sgr_transition(color.bold + color.red, color.bold + color.green) == '\x1b[32m'
+    assert color.sgr_transition(color.red, color.red) == ''
+
+
+def test_render_segments(colored):
+    s = color.render_segments([
+        (color.bold + color.red, 'a'),
+        (color.bold + color.red, 'b'),
+        (color.bold + color.green, 'c'),
+        (None, ''),
+        (None, 'd'),
+        (color.blue_bg, 'e'),
+    ])
+    assert s == '\x1b[1;31mab\x1b[32mc\x1b[22;39md\x1b[44me\x1b[49m'
+
+
+def test_render_segments_no_color(colored):
+    with color.color_context(False):
+        assert color.render_segments([(color.red, 'a'), (None, 'b')]) == 'ab'
+        assert color.render_segments(iter([(color.red, 'a'), (color.bold, 'c')])) == 'ac'
+
+
+def test_minimize_sgr(colored):
+    s = color.red('a') + color.green('b')
+    assert color.minimize_sgr(s) == '\x1b[31ma\x1b[32mb\x1b[39m'
+
+    s = color.bold(color.yellow(color.red_bg('x')))
+    assert color.minimize_sgr(s) == '\x1b[1;33;41mx\x1b[22;39;49m'
+
+    # styles without text in between disappear
+    assert color.minimize_sgr(color.red('') + 'x') == 'x'
+    assert color.minimize_sgr('plain') == 'plain'
+    assert color.minimize_sgr('\x1b[2Jclear\x1b[m') == '\x1b[2Jclear'
+
+
+def test_minimize_combination(colored):
+    tpl = color.green('the quick {} jump over the {} dog')
+    f = tpl.format(
+        color.yellow('brown fox'),
+        color.red('lazy') + color.green(''),
+    )
+    m = color.minimize_sgr(f)
+    assert len(m) < len(f)
+    assert m == ('\x1b[32mthe quick \x1b[33mbrown fox\x1b[39m jump over the '
+                 '\x1b[31mlazy\x1b[39m dog')
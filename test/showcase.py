@@ -8,27 +8,21 @@ from rgbxterm_test import CLUT
 color_names = ['red', 'green', 'yellow', 'blue', 'magenta', 'cyan']
 
 
-def static_width(s, width, length=None):
-    if length is None:
-        length = len(s)
-    return s + (' ' * (width - length))
-
-
 if __name__ == '__main__':
     print()
     print('{} {} {}'.format(
-        static_width('color(s)', 8),
-        static_width('color_bg(s)', 12),
-        static_width('color_hl(s)', 12),
+        color.ljust('color(s)', 8),
+        color.ljust('color_bg(s)', 12),
+        color.ljust('color_hl(s)', 12),
     ))
     for i in color_names:
         t0 = i
         t1 = i + '_bg'
         t2 = i + '_hl'
         print('{} {} {}'.format(
-            static_width(getattr(color, t0)(t0), 8, len(t0)),
-            static_width(getattr(color, t1)(t1), 12, len(t1)),
-            static_width(getattr(color, t2)(t2), 12, len(t2)),
+            color.ljust(getattr(color, t0)(t0), 8),
+            color.ljust(getattr(color, t1)(t1), 12),
+            color.ljust(getattr(color, t2)(t2), 12),
         ))
     print()
 
@@ -0,0 +1,66 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+def test_named_colors_render_unchanged(colored):
+    assert color.red('red') == '\x1b[31mred\x1b[39m'
+    assert color.red_bg('red') == '\x1b[41mred\x1b[49m'
+    assert color.red_hl('red') == '\x1b[1;31;7mred' + color.HL_END
+    assert color.bold('bold') == '\x1b[1mbold\x1b[22m'
+
+
+def test_compose_single_prefix_and_suffix(colored):
+    style = color.bold + color.yellow + color.red_bg
+    assert style.start == '\x1b[1;33;41m'
+    assert style.end == '\x1b[22;39;49m'
+    assert style('s') == '\x1b[1;33;41ms\x1b[22;39;49m'
+    assert (color.bold | color.yellow | color.red_bg) == style
+
+
+def test_compose_right_side_wins(colored):
+    assert color.red + color.green == color.green
+    assert (color.red + color.blue_bg + color.green).codes == (32, 44)
+    assert (color.grayscale[0] + color.red).codes == (31,)
+    assert (color.red + color.grayscale_bg[3]).codes == (31, 48, 5, 235)
+
+
+def test_shared_reset_code(colored):
+    style = color.Style(1, 2)
+    assert style.end == '\x1b[22m'
+
+
+def test_extended_codes():
+    style = color.Style(38, 2, 1, 2, 3, 48, 5, 100, 4)
+    assert style.params == ((4,), (38, 2, 1, 2, 3), (48, 5, 100))
+    assert style.end == '\x1b[24;39;49m'
+
+
+def test_no_color(colored):
+    with color.color_context(False):
+        assert (color.bold + color.red)('s') == 's'
+
+
+def test_empty_and_invalid():
+    assert color.Style()('s') == 's'
+    with pytest.raises(ValueError):
+        color.Style(0)
+
+
+def test_hashable():
+    assert len({color.red, color.Style(31), color.green}) == 2
+
+
+def test_order_of_codes_ignored():
+    assert color.bold + color.red == color.red + color.bold
+    assert hash(color.bold + color.red) == hash(color.red + color.bold)
+    assert (color.red + color.bold).start == '\x1b[1;31m'
+    assert color.Style(38, 5, 255, 1, 7) == color.Style(1, 38, 5, 255, 7)
+    assert color.Style(7, 31, 1).start == color.red_hl.start
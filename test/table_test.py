@@ -0,0 +1,68 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_table import Table, table, truncate  # NOQA
+
+
+def test_render(colored):
+    t = Table(['name', 'status', 'n'], align='lcr')
+    t.add_row('api', ('ok', color.green), 1)
+    t.add_row('worker', ('failed', color.bold + color.red), 120)
+    out = t.render()
+    print()
+    print(out)
+    assert [color.strip_ansi(line) for line in out.split('\n')] == [
+        'name    status    n',
+        'api       ok      1',
+        'worker  failed  120',
+    ]
+    assert '\x1b[32mok\x1b[39m' in out
+    assert '\x1b[1;31mfailed\x1b[22;39m' in out
+    assert out.startswith('\x1b[1mname\x1b[22m')
+
+
+def test_widths_from_raw_text(colored):
+    t = Table()
+    t.add_row(('日本', color.red), 'x')
+    t.add_row('abc', ('y', lambda s: color.fg256('912D2B', s)))
+    assert t.widths == [4, 1]
+    assert [color.visible_len(line) for line in t.lines()] == [7, 7]
+
+
+def test_no_color(colored):
+    with color.color_context(False):
+        assert table([[('a', color.red), 'b']]) == 'a  b'
+
+
+def test_stream(colored):
+    rows = ([str(i), ('x' * (i % 5), color.red)] for i in range(20))
+    t = Table(['i', 'x'], align='r')
+    lines = list(t.stream(rows, sample=3))
+    assert len(lines) == 21
+    assert t.widths == [1, 2]
+    assert color.strip_ansi(lines[1]) == '0  '
+    assert color.strip_ansi(lines[5]) == '4  x…'
+    assert all(color.visible_len(line) <= 5 for line in lines)
+
+    t = Table()
+    lines = list(t.stream([['a'], ['abcdef']], sample=1, cut=False))
+    assert lines == ['a', 'abcdef']
+
+
+@pytest.mark.parametrize('text, width, result', [
+    ('abc', 3, 'abc'),
+    ('abcd', 3, 'ab…'),
+    ('abcd', 1, '…'),
+    ('abcd', 0, ''),
+    ('日本語', 4, '日…'),
+    ('日本語', 5, '日本…'),
+])
+def test_truncate(text, width, result):
+    assert truncate(text, width) == result
@@ -0,0 +1,108 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from color_text import Text  # NOQA
+
+ERROR = color.bold + color.red
+
+
+def sid(style):
+    return color.style_registry.intern(style)
+
+
+def sample():
+    return Text.assemble(('error', ERROR), ': disk ', ('/dev/sda1', color.cyan), ' is full')
+
+
+def test_assemble():
+    t = sample()
+    assert t.plain == 'error: disk /dev/sda1 is full'
+    assert list(t.span_tuples()) == [(0, 5, sid(ERROR)), (12, 21, sid(color.cyan))]
+
+
+def test_render(colored):
+    assert sample().render() == '\x1b[1;31merror\x1b[22;39m: disk \x1b[36m/dev/sda1\x1b[39m is full'
+    assert sample().render_bytes() == sample().render().encode()
+    assert str(sample()) == sample().render()
+
+
+def test_render_adjacent_spans(colored):
+    t = Text.assemble(('a', ERROR), ('b', color.red), ('c', color.red))
+    assert list(t.span_tuples()) == [(0, 1, sid(ERROR)), (1, 3, sid(color.red))]
+    assert t.render() == '\x1b[1;31ma\x1b[22mbc\x1b[39m'
+
+
+def test_render_no_color(colored):
+    with color.color_context(False):
+        assert sample().render() == sample().plain
+        assert sample().render_bytes() == sample().plain.encode()
+
+
+def test_slice():
+    t = sample()
+    assert t[3:15] == Text('or: disk /de', [0, 2, sid(ERROR), 9, 12, sid(color.cyan)])
+    assert t[5:12] == Text(': disk ')
+    assert t[-4:].plain == 'full'
+    assert t[0] == Text('e', [0, 1, sid(ERROR)])
+    assert t[-1] == Text('l')
+    with pytest.raises(ValueError):
+        t[::2]
+    for i in (len(t), -len(t) - 1):
+        with pytest.raises(IndexError):
+            t[i]
+
+
+def test_concat():
+    t = sample()
+    assert t[:8] + t[8:] == t
+    assert (t + '!').plain == t.plain + '!'
+    assert ('> ' + t)[2:] == t
+    assert list(('> ' + t).span_tuples())[0] == (2, 7, sid(ERROR))
+
+
+def test_truncate():
+    t = sample()
+    assert t.truncate(100) is t
+    cut = t.truncate(12)
+    assert cut.plain == 'error: disk…'
+    assert list(cut.span_tuples()) == [(0, 5, sid(ERROR))]
+    # the ellipsis takes the style of the last character kept
+    assert list(t.truncate(15).span_tuples())[-1] == (12, 15, sid(color.cyan))
+    assert t.truncate(1) == Text('…')
+    assert t.truncate(0) == Text()
+
+
+def test_truncate_wide():
+    t = Text.styled('日本語', color.red)
+    assert t.truncate(5).plain == '日本…'
+    assert t.truncate(4).plain == '日…'
+
+
+def test_wrap():
+    lines = sample().wrap(8)
+    assert [line.plain for line in lines] == ['error:', 'disk', '/dev/sda', '1 is', 'full']
+    assert lines[3] == Text('1 is', [0, 1, sid(color.cyan)])
+    assert [line.plain for line in sample().wrap(100)] == [sample().plain]
+
+
+def test_wrap_paragraphs_and_wide():
+    t = Text('ab cd\n\nef')
+    assert [line.plain for line in t.wrap(2)] == ['ab', 'cd', '', 'ef']
+    assert [line.plain for line in Text('日本語テ').wrap(5)] == ['日本', '語テ']
+
+
+def test_segments():
+    segments = list(sample().segments())
+    assert segments == [(ERROR, 'error'), (None, ': disk '), (color.cyan, '/dev/sda1'), (None, ' is full')]
+
+
+def test_styled():
+    assert Text.styled('x', None) == Text('x')
+    assert Text.styled('x', sid(color.red)) == Text.styled('x', color.red)
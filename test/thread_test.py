@@ -0,0 +1,170 @@
+# coding: utf-8
+
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+@pytest.fixture
+def switch_often():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def run_threads(n, target):
+    barrier = threading.Barrier(n)
+    errors = []
+
+    def run(i):
+        barrier.wait()
+        try:
+            target(i)
+        except BaseException as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def test_fg256_stress(colored, switch_often):
+    # more distinct colors than the cache holds, so threads evict each other's entries
+    rand = random.Random(0)
+    colors = [(rand.randrange(256), rand.randrange(256), rand.randrange(256))
+              for _ in range(color.CACHE_MAXSIZE + 1000)]
+    expected = {rgb: color.FG256_PREFIXES[color.rgb_to_xterm._origin(*rgb)] + 'x' + color.fg256.end
+                for rgb in colors}
+    color.rgb_to_xterm.cache_clear()
+    color.hex_to_rgb.cache_clear()
+
+    def target(i):
+        rand = random.Random(i)
+        for _ in range(3000):
+            rgb = rand.choice(colors)
+            assert color.fg256(rgb, 'x') == expected[rgb]
+            assert color.fg256('{:02x}{:02x}{:02x}'.format(*rgb), 'x') == expected[rgb]
+
+    run_threads(16, target)
+    assert color.rgb_to_xterm.cache_info().currsize <= color.CACHE_MAXSIZE
+
+
+def test_concurrent_misses_compute_once():
+    calls = []
+
+    @color.memorize(maxsize=10)
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.05)
+        return x * 2
+
+    results = []
+    run_threads(8, lambda i: results.append(slow(3)))
+    assert results == [6] * 8
+    assert calls == [3]
+
+
+def test_concurrent_miss_raises():
+    calls = []
+
+    @color.memorize
+    def fail(x):
+        calls.append(x)
+        time.sleep(0.05)
+        raise ValueError(x)
+
+    def target(i):
+        with pytest.raises(ValueError):
+            fail(1)
+
+    run_threads(4, target)
+    # the waiting threads compute it themselves once the first one raised
+    assert 1 <= len(calls) <= 4
+    assert fail.cache_info().currsize == 0
+
+
+def test_color_context_per_thread(colored):
+    results = {}
+
+    def target(i):
+        if i % 2:
+            with color.color_context(False):
+                results[i] = color.red('x'), color.fg256('fff', 'x'), color.fgtrue('fff', 'x')
+        else:
+            results[i] = color.red('x'), color.fg256('fff', 'x'), color.fgtrue('fff', 'x')
+
+    run_threads(8, target)
+    for i, (red, fg256, fgtrue) in results.items():
+        if i % 2:
+            assert (red, fg256, fgtrue) == ('x', 'x', 'x')
+        else:
+            assert red == '\x1b[31mx\x1b[39m'
+            assert fg256 == fgtrue == '\x1b[38;5;255mx\x1b[39m'
+
+
+def test_color_context_per_task(colored):
+    async def task(enabled):
+        with color.color_context(enabled):
+            await asyncio.sleep(0.01)
+            return color.red('x'), color.use_color()
+
+    async def main():
+        return await asyncio.gather(task(True), task(False), task(True))
+
+    assert asyncio.run(main()) == [('\x1b[31mx\x1b[39m', True), ('x', False), ('\x1b[31mx\x1b[39m', True)]
+
+
+def test_color_context_level(colored):
+    with color.color_context(level=color.COLOR_TRUE) as support:
+        assert support.level == color.COLOR_TRUE
+        assert color.color_support() is support
+        assert color.fgtrue('fff', 'x') == '\x1b[38;2;255;255;255mx\x1b[39m'
+        with color.color_context(False):
+            assert color.fgtrue('fff', 'x') == 'x'
+        assert color.fgtrue('fff', 'x') == '\x1b[38;2;255;255;255mx\x1b[39m'
+    assert color.color_support().level == color.COLOR_256
+
+
+def test_color_context_reused(colored):
+    plain = color.color_context(False)
+    with plain:
+        with plain:
+            assert color.red('x') == 'x'
+        assert color.red('x') == 'x'
+    assert color.red('x') == '\x1b[31mx\x1b[39m'
+
+    results = {}
+    barrier = threading.Barrier(4)
+
+    def target(i):
+        with plain:
+            barrier.wait()
+            results[i] = color.red('x')
+        results[i] += color.red('y')
+
+    run_threads(4, target)
+    assert set(results.values()) == {'x\x1b[31my\x1b[39m'}
+    assert color.red('x') == '\x1b[31mx\x1b[39m'
+
+
+def test_color_context_enables(colored, monkeypatch):
+    monkeypatch.setenv('NO_COLOR', '1')
+    color.reset_color_support()
+    assert color.red('x') == 'x'
+    with color.color_context():
+        assert color.red('x') == '\x1b[31mx\x1b[39m'
+        assert color.color_support().level == color.COLOR_256
@@ -0,0 +1,64 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from rgbxterm_test import CLUT  # NOQA
+
+
+@pytest.fixture
+def level(colored, monkeypatch):
+    def set_level(env):
+        for k, v in env.items():
+            monkeypatch.setenv(k, v)
+        color.reset_color_support()
+    return set_level
+
+
+def test_truecolor(level):
+    level({'COLORTERM': 'truecolor'})
+    assert color.color_support().level == color.COLOR_TRUE
+    assert color.fgtrue('912D2B', 'x') == '\x1b[38;2;145;45;43mx\x1b[39m'
+    assert color.bgtrue((1, 2, 3), 'x') == '\x1b[48;2;1;2;3mx\x1b[49m'
+    assert color.hltrue('fff', 'x') == '\x1b[1;38;2;255;255;255;7mx\x1b[27;39;22m'
+
+
+def test_256_fallback(level):
+    level({'TERM': 'xterm-256color'})
+    for hex in ('912D2B', '555', '10a3a3'):
+        assert color.fgtrue(hex, 'x') == color.fg256(hex, 'x')
+        assert color.bgtrue(hex, 'x') == color.bg256(hex, 'x')
+        assert color.hltrue(hex, 'x') == color.hl256(hex, 'x')
+
+
+def test_16_fallback(level):
+    level({'TERM': 'linux'})
+    assert color.fgtrue('ff0000', 'x') == '\x1b[91mx\x1b[39m'
+    assert color.fgtrue('800000', 'x') == color.red('x')
+    assert color.bgtrue('00ffff', 'x') == '\x1b[106mx\x1b[49m'
+    assert color.bgtrue('000080', 'x') == color.blue_bg('x')
+    assert color.hltrue('008000', 'x') == '\x1b[1;32;7mx\x1b[27;39;22m'
+
+
+def test_force_color_level(level):
+    level({'TERM': 'linux', 'FORCE_COLOR': '3'})
+    assert color.color_support().level == color.COLOR_TRUE
+    level({'TERM': 'xterm-256color', 'FORCE_COLOR': '1'})
+    assert color.color_support().level == color.COLOR_256
+
+
+def test_no_color(level):
+    level({'NO_COLOR': '1'})
+    assert color.fgtrue('912D2B', 'x') == 'x'
+
+
+def test_rgb_to_ansi16():
+    for _, hex in CLUT[:16]:
+        rgb = color.hex_to_rgb(hex)
+        assert color.ANSI16_RGB[color.rgb_to_ansi16(*rgb)] == rgb
+    assert color.rgb_to_ansi16(250, 10, 10) == 9
@@ -0,0 +1,66 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+def all_colored(s):
+    """s rendered by every kind of color function"""
+    yield color.red(s)
+    yield color.red_hl(s)
+    yield (color.bold + color.yellow + color.red_bg)(s)
+    yield color.grayscale_hl[3](s)
+    yield color.fg256('912D2B', s)
+    yield color.bg256('A9D5DE', color.fg256('276F86', s))
+    yield color.hl256('10a3a3', s)
+    yield color.fgtrue('10a3a3', s)
+    yield color.minimize_sgr(color.red(s) + color.green(''))
+
+
+def test_strip_ansi(colored):
+    for s in all_colored('Info!'):
+        assert color.strip_ansi(s) == 'Info!'
+    assert color.strip_ansi('plain') == 'plain'
+    assert color.strip_ansi('\x1b[2J\x1b[1;1Hhome\x1b[?25l') == 'home'
+    assert color.strip_ansi('\x1b]8;;http://a\x1b\\link\x1b]8;;\x07') == 'link'
+    assert color.strip_ansi('\x1b(Bx\x1b7y\x1b8') == 'xy'
+
+
+@pytest.mark.parametrize('s, width', [
+    ('', 0),
+    ('abc', 3),
+    ('日本語', 6),
+    ('ｱｲ', 2),  # half width katakana
+    ('é', 1),  # combining accent
+    ('한글 ok', 7),
+    ('a​b', 2),  # zero width space
+])
+def test_visible_len(colored, s, width):
+    assert color.text_width(s) == width
+    for c in all_colored(s):
+        assert color.visible_len(c) == width
+
+
+def test_text_cut():
+    assert color.text_cut('abcdef', 4) == 4
+    assert color.text_cut('abc', 10) == 3
+    assert color.text_cut('abc', -1) == 0
+    assert color.text_cut('日本語', 3) == 1
+    assert color.text_cut('日本語', 4) == 2
+    assert color.text_cut('a日b', 2) == 1
+
+
+def test_justify(colored):
+    for w in range(8):
+        for t in ('', 'a', 'ab', 'abc', 'abcdefghi'):
+            c = color.red(t)
+            assert color.strip_ansi(color.ljust(c, w)) == t.ljust(w)
+            assert color.strip_ansi(color.rjust(c, w, '.')) == t.rjust(w, '.')
+            assert color.strip_ansi(color.center(c, w, '*')) == t.center(w, '*')
+    assert color.ljust(color.red('日本'), 6) == color.red('日本') + '  '
@@ -0,0 +1,90 @@
+# coding: utf-8
+
+import io
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+class CountingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+def test_coalesce_same_style():
+    stream = io.StringIO()
+    with color.ColorWriter(stream, color=True) as w:
+        w.write(color.red, 'error: ')
+        w.write(color.red, 'not found')
+        w.write(color.Style(31), '!')
+        w.write(None, ' ')
+        w.write(color.bold + color.green, 'ok')
+        w.write(color.bold + color.green, '')
+    assert stream.getvalue() == (
+        '\x1b[31merror: not found!\x1b[39m \x1b[1;32mok\x1b[22;39m')
+
+
+def test_style_switch():
+    stream = io.StringIO()
+    with color.ColorWriter(stream, color=True) as w:
+        w.write_segments([(color.red, 'a'), (color.blue_bg, 'b'), (None, 'c')])
+    assert stream.getvalue() == '\x1b[31ma\x1b[39;44mb\x1b[49mc'
+
+
+def test_buffered_writes():
+    stream = CountingStream()
+    w = color.ColorWriter(stream, buffer_size=1000, color=True)
+    for i in range(1000):
+        w.write(color.red if i % 2 else color.green, 'x' * 10)
+    assert stream.writes == 10
+    w.flush()  # the closing reset
+    assert stream.writes == 11
+    assert stream.getvalue().count('x') == 10000
+    assert stream.getvalue().endswith(color.FG_END)
+
+
+def test_no_color():
+    stream = io.StringIO()
+    with color.ColorWriter(stream, color=False) as w:
+        w.write(color.red, 'a')
+        w.write(color.bold, 'b')
+    assert stream.getvalue() == 'ab'
+
+
+def test_color_from_stream(colored):
+    color.use_color_no_tty(False)
+    assert color.ColorWriter(io.StringIO()).color is False
+    color.use_color_no_tty(True)
+    assert color.ColorWriter(io.StringIO()).color is True
+
+
+def test_color_from_context(colored):
+    class TTY(io.StringIO):
+        def isatty(self):
+            return True
+
+    assert color.ColorWriter(TTY()).color is True
+    with color.color_context(False):
+        assert color.ColorWriter(TTY()).color is False
+        assert color.ColorWriter(io.StringIO(), color=True).color is True
+    color.use_color_no_tty(False)
+    with color.color_context():
+        assert color.ColorWriter(io.StringIO()).color is True
+
+
+def test_binary_stream():
+    stream = io.BytesIO()
+    with color.ColorWriter(stream, color=True) as w:
+        assert w.binary
+        w.write(color.red, 'ä')
+    assert stream.getvalue() == '\x1b[31mä\x1b[39m'.encode()
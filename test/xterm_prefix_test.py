@@ -0,0 +1,29 @@
+# coding: utf-8
+
+import os
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+
+
+def test_prefixes():
+    assert len(color.FG256_PREFIXES) == len(color.BG256_PREFIXES) == len(color.HL256_PREFIXES) == 256
+    assert color.FG256_PREFIXES[88] == '\x1b[38;5;88m'
+    assert color.BG256_PREFIXES[0] == '\x1b[48;5;0m'
+    assert color.HL256_PREFIXES[255] == '\x1b[1;38;5;255;7m'
+    assert color.HL256_END == '\x1b[27;39;22m'
+    assert color.fg256.prefixes is color.FG256_PREFIXES
+    assert color.bg256.end == color.BG_END
+
+
+def test_render_with_prefixes(colored):
+    x = color.rgb_to_xterm(*color.hex_to_rgb('912D2B'))
+    for func in (color.fg256, color.bg256, color.hl256):
+        expected = func.prefixes[x] + 'Warning!' + func.end
+        assert func('912D2B', 'Warning!') == expected
+        assert func((0x91, 0x2d, 0x2b), 'Warning!') == expected
+        assert func(None, 'Warning!', x=x) == expected
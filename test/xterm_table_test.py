@@ -0,0 +1,69 @@
+# coding: utf-8
+
+import os
+import random
+
+import pytest
+
+if os.getenv('COLOR_COMPAT'):
+    pytest.skip('color.py only', allow_module_level=True)
+
+import color  # NOQA
+from rgbxterm_test import CLUT  # NOQA
+
+
+@pytest.fixture
+def fresh_table():
+    color.reset_xterm_table()
+    yield
+    color.reset_xterm_table()
+
+
+def test_table_matches_rgb_to_xterm(fresh_table):
+    table = color.xterm_table()
+    assert len(table) == color.XTERM_TABLE_SIZE
+    rgb_to_xterm = color.rgb_to_xterm._origin
+    rand = random.Random(0)
+    for _ in range(20000):
+        r, g, b = rand.randrange(256), rand.randrange(256), rand.randrange(256)
+        assert table[(r << 16) | (g << 8) | b] == rgb_to_xterm(r, g, b)
+    for v in range(256):
+        assert color.rgb_to_xterm_lut(v, v, v) == rgb_to_xterm(v, v, v)
+    for _, hex in CLUT:
+        rgb = color.hex_to_rgb(hex)
+        assert color.rgb_to_xterm_lut(*rgb) == color.rgb_to_xterm(*rgb)
+
+
+def test_table_is_built_once(fresh_table):
+    assert color.xterm_table() is color.xterm_table()
+
+
+def test_mmap_table(fresh_table, tmp_path):
+    path = str(tmp_path / 'xterm.bin')
+    table = color.xterm_table(path)
+    assert os.path.getsize(path) == color.XTERM_TABLE_SIZE
+    assert color.rgb_to_xterm_lut(0x91, 0x2d, 0x2b) == color.rgb_to_xterm(0x91, 0x2d, 0x2b)
+    table.close()
+
+    # an existing file is mapped as is
+    color.reset_xterm_table()
+    table = color.xterm_table(path)
+    assert table[0xffffff] == color.rgb_to_xterm(255, 255, 255)
+    table.close()
+
+
+def test_rgb_out_of_range():
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm._origin(256, 0, 0)
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm._origin(-1, -1, -1)
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm_lut(0, 256, 0)
+    with pytest.raises(ValueError):
+        color.rgb_to_xterm_lut(-1, 0, 0)
+
+
+def test_float_values(fresh_table):
+    assert color.rgb_to_xterm._origin(145.7, 45.2, 43.0) == color.rgb_to_xterm(145, 45, 43)
+    assert color.rgb_to_xterm._origin(12.5, 12.5, 12.5) == color.rgb_to_xterm(12, 12, 12)
+    assert color.rgb_to_xterm_lut(145.7, 45.2, 43.0) == color.rgb_to_xterm(145, 45, 43)